@@ -1,11 +1,16 @@
 'use client';
-import { useState, useCallback } from 'react';
+import { useState, useCallback, useEffect, useRef } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { useApi } from '@/lib/api';
 import { Alert, AlertDescription, AlertTitle } from '@/components/ui/alert';
 import { Skeleton } from '@/components/ui/skeleton';
 import { Progress } from '@/components/ui/progress';
-import { X, FileText, CheckCircle, XCircle } from 'lucide-react';
+import { X, FileText, CheckCircle, XCircle, Loader2 } from 'lucide-react';
+import { UploadJob } from '@/types';
+
+// How often queued uploads are checked, and how many failed checks end polling
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_MAX_ERRORS = 5;
 
 interface PDFUploadProps {
     clientId: string;
@@ -14,17 +19,14 @@ interface PDFUploadProps {
 
 interface UploadResult {
     filename: string;
-    status: 'success' | 'error';
+    status: 'queued' | 'error';
     message?: string;
-    file_id?: string;
-    chunks_count?: number;
-    pages?: number;
+    job_id?: string;
     file_size?: number;
 }
 
 interface UploadResponse {
     message: string;
-    total_chunks_added: number;
     results: UploadResult[];
 }
 
@@ -34,8 +36,70 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
     const [selectedFiles, setSelectedFiles] = useState<File[]>([]);
     const [uploadResults, setUploadResults] = useState<UploadResult[]>([]);
     const [uploadStatus, setUploadStatus] = useState<{ message: string; success: boolean } | null>(null);
+    const [jobs, setJobs] = useState<Record<string, UploadJob>>({});
+    const [processing, setProcessing] = useState(false);
+    const unmounted = useRef(false);
     const api = useApi();
 
+    useEffect(() => {
+        unmounted.current = false;
+        return () => {
+            unmounted.current = true;
+        };
+    }, []);
+
+    // Follow queued uploads until the worker has stored or rejected each one
+    const pollJobs = async (jobIds: string[]) => {
+        setProcessing(true);
+        const errors: Record<string, number> = {};
+        const finished: UploadJob[] = [];
+        let pending = jobIds;
+
+        while (pending.length > 0 && !unmounted.current) {
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            const polled = await Promise.all(
+                pending.map(jobId => api.getUploadJob(jobId).catch(() => null))
+            );
+            if (unmounted.current) return;
+
+            const stillPending: string[] = [];
+            let stored = false;
+            polled.forEach((job, i) => {
+                const jobId = pending[i];
+                if (!job) {
+                    errors[jobId] = (errors[jobId] || 0) + 1;
+                    if (errors[jobId] < JOB_POLL_MAX_ERRORS) stillPending.push(jobId);
+                    return;
+                }
+                setJobs(prev => ({ ...prev, [jobId]: job }));
+                if (job.status === 'done' || job.status === 'failed') {
+                    finished.push(job);
+                    stored = stored || job.status === 'done';
+                } else {
+                    stillPending.push(jobId);
+                }
+            });
+
+            // Show each file in the list as soon as it has been stored
+            if (stored) onUploadComplete?.();
+            pending = stillPending;
+        }
+        if (unmounted.current) return;
+
+        const done = finished.filter(job => job.status === 'done').length;
+        const failed = finished.length - done;
+        const unknown = jobIds.length - finished.length;
+        setUploadStatus({
+            message: [
+                `${done} file${done === 1 ? '' : 's'} processed`,
+                failed > 0 ? `${failed} failed` : '',
+                unknown > 0 ? `${unknown} could not be checked, refresh later` : '',
+            ].filter(Boolean).join(', '),
+            success: failed === 0 && unknown === 0,
+        });
+        setProcessing(false);
+    };
+
     const onDrop = useCallback((acceptedFiles: File[]) => {
         // Filter for PDF files only
         const pdfFiles = acceptedFiles.filter(file => file.name.endsWith('.pdf'));
@@ -62,6 +126,7 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
         setUploading(true);
         setUploadStatus(null);
         setUploadProgress(0);
+        setJobs({});
 
         try {
             const formData = new FormData();
@@ -82,13 +147,16 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
             setUploadResults(response.results);
             setUploadStatus({
                 message: response.message,
-                success: response.results.some(r => r.status === 'success')
+                success: response.results.some(r => r.status === 'queued')
             });
 
             // Clear selected files after successful upload
-            if (response.results.some(r => r.status === 'success')) {
+            const jobIds = response.results
+                .filter(r => r.status === 'queued' && r.job_id)
+                .map(r => r.job_id as string);
+            if (jobIds.length > 0) {
                 setSelectedFiles([]);
-                onUploadComplete?.();
+                pollJobs(jobIds);
             }
 
         } catch (error: any) {
@@ -116,9 +184,46 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
             'application/pdf': ['.pdf'],
         },
         multiple: true,
-        disabled: uploading,
+        disabled: uploading || processing,
     });
 
+    const renderResult = (result: UploadResult) => {
+        const job = result.job_id ? jobs[result.job_id] : undefined;
+        if (result.status === 'error' || job?.status === 'failed') {
+            return {
+                icon: <XCircle className="h-5 w-5 text-red-500 mt-0.5 flex-shrink-0" />,
+                detail: <p className="text-xs text-red-600">{job?.error || result.message}</p>,
+            };
+        }
+        if (job?.status === 'done') {
+            return {
+                icon: <CheckCircle className="h-5 w-5 text-green-500 mt-0.5 flex-shrink-0" />,
+                detail: (
+                    <div className="text-xs text-gray-500 space-y-1">
+                        <p>{job.chunks_count} chunks from {job.pages} pages</p>
+                        <p>{formatFileSize(job.size)}</p>
+                    </div>
+                ),
+            };
+        }
+
+        let state = 'Queued for processing';
+        if (job?.status === 'processing') {
+            state = `Processing${job.stage ? ` (${job.stage})` : ''}...`;
+        } else if (job?.status === 'retrying') {
+            state = `Retrying after an error: ${job.error}`;
+        }
+        return {
+            icon: <Loader2 className="h-5 w-5 text-blue-500 mt-0.5 flex-shrink-0 animate-spin" />,
+            detail: (
+                <div className="text-xs text-gray-500 space-y-1">
+                    <p>{state}</p>
+                    <p>{result.file_size ? formatFileSize(result.file_size) : ''}</p>
+                </div>
+            ),
+        };
+    };
+
     return (
         <div className="space-y-6">
             {/* Drop Zone */}
@@ -165,7 +270,7 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
                         </h3>
                         <button
                             onClick={uploadFiles}
-                            disabled={uploading}
+                            disabled={uploading || processing}
                             className="px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 disabled:opacity-50 disabled:cursor-not-allowed font-medium"
                         >
                             {uploading ? 'Uploading...' : `Upload ${selectedFiles.length} File${selectedFiles.length > 1 ? 's' : ''}`}
@@ -216,28 +321,20 @@ export default function PDFUpload({ clientId, onUploadComplete }: PDFUploadProps
                 <div className="space-y-3">
                     <h3 className="text-lg font-medium text-gray-900">Upload Results</h3>
                     <div className="bg-gray-50 rounded-lg p-4 max-h-60 overflow-y-auto">
-                        {uploadResults.map((result, index) => (
-                            <div key={index} className="flex items-start space-x-3 py-3 px-3 bg-white rounded-md mb-2 last:mb-0">
-                                {result.status === 'success' ? (
-                                    <CheckCircle className="h-5 w-5 text-green-500 mt-0.5 flex-shrink-0" />
-                                ) : (
-                                    <XCircle className="h-5 w-5 text-red-500 mt-0.5 flex-shrink-0" />
-                                )}
-                                <div className="flex-1 min-w-0">
-                                    <p className="text-sm font-medium text-gray-900 truncate">
-                                        {result.filename}
-                                    </p>
-                                    {result.status === 'success' ? (
-                                        <div className="text-xs text-gray-500 space-y-1">
-                                            <p>{result.chunks_count} chunks • {result.pages} pages</p>
-                                            <p>{result.file_size ? formatFileSize(result.file_size) : ''}</p>
-                                        </div>
-                                    ) : (
-                                        <p className="text-xs text-red-600">{result.message}</p>
-                                    )}
+                        {uploadResults.map((result, index) => {
+                            const { icon, detail } = renderResult(result);
+                            return (
+                                <div key={index} className="flex items-start space-x-3 py-3 px-3 bg-white rounded-md mb-2 last:mb-0">
+                                    {icon}
+                                    <div className="flex-1 min-w-0">
+                                        <p className="text-sm font-medium text-gray-900 truncate">
+                                            {result.filename}
+                                        </p>
+                                        {detail}
+                                    </div>
                                 </div>
-                            </div>
-                        ))}
+                            );
+                        })}
                     </div>
                 </div>
             )}
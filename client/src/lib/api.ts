@@ -10,6 +10,7 @@ import {
   SessionAnalytics,
   KnowledgeBaseAnalytics,
   MultipleUploadResponse,
+  UploadJob,
   FileInfo,
 } from "@/types";
 import { useAuth } from "@clerk/nextjs";
@@ -203,6 +204,13 @@ class ApiClient {
     return response.data;
   }
 
+  async getUploadJob(jobId: string): Promise<UploadJob> {
+    const response = await this.instance.get<UploadJob>(
+      `/upload/jobs/${encodeURIComponent(jobId)}`
+    );
+    return response.data;
+  }
+
   async getFiles(): Promise<{
     files: FileInfo[];
     total_files: number;
@@ -284,6 +292,11 @@ export const useApi = () => {
       return api.uploadMultiplePDFs(formData);
     },
 
+    getUploadJob: async (jobId: string) => {
+      await initialize();
+      return api.getUploadJob(jobId);
+    },
+
     getFiles: async () => {
       await initialize();
       return api.getFiles();
@@ -174,20 +174,32 @@ export type UseCaseValue = (typeof USE_CASE_OPTIONS)[number]["value"];
 
 export interface UploadResult {
   filename: string;
-  status: "success" | "error";
+  status: "queued" | "error";
   message?: string;
-  file_id?: string;
-  chunks_count?: number;
-  pages?: number;
+  job_id?: string;
   file_size?: number;
 }
 
 export interface MultipleUploadResponse {
   message: string;
-  total_chunks_added: number;
   results: UploadResult[];
 }
 
+// Background processing of a queued upload
+export interface UploadJob {
+  job_id: string;
+  client_id: string;
+  filename: string;
+  size: number;
+  status: "queued" | "processing" | "retrying" | "done" | "failed";
+  stage?: string;
+  attempts?: number;
+  pages?: number;
+  chunks_count?: number;
+  file_id?: number;
+  error?: string;
+}
+
 // File management interfaces
 export interface FileInfo {
   filename: string;
@@ -0,0 +1,125 @@
+import os
+import logging
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Average characters per token for Gemini-style tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast token count estimate, close enough for prompt budgeting"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    return text[: max_tokens * CHARS_PER_TOKEN]
+
+
+class ContextBuilder:
+    """Assemble prompt context under separate token budgets per section"""
+
+    def __init__(self):
+        # Welcome message shown in the system prompt
+        self.system_budget = int(os.getenv("CONTEXT_SYSTEM_TOKENS", "300"))
+        # Chat history, filled with the most recent turns first
+        self.history_budget = int(os.getenv("CONTEXT_HISTORY_TOKENS", "1500"))
+        # Retrieved document chunks, filled in rank order
+        self.chunk_budget = int(os.getenv("CONTEXT_CHUNK_TOKENS", "2000"))
+
+    def build(
+        self,
+        welcome_message: str,
+        turns: List[Dict[str, str]],
+        chunks: List[Dict[str, Any]],
+        summary: str = "",
+    ) -> Dict[str, Any]:
+        """Return the budgeted welcome message, context string and token counts"""
+        welcome_message = truncate_to_tokens(welcome_message or "", self.system_budget)
+        history, history_tokens = self._fit_history(turns, summary)
+        passages, chunk_tokens = self._fit_chunks(chunks)
+
+        context = "Here is the current chat history:\n" + history
+        context += "\n\nRelevant context:\n" + "\n".join(passages)
+
+        return {
+            "welcome_message": welcome_message,
+            "context": context,
+            "tokens": {
+                "system": estimate_tokens(welcome_message),
+                "history": history_tokens,
+                "chunks": chunk_tokens,
+            },
+        }
+
+    def _fit_history(self, turns: List[Dict[str, str]], summary: str = ""):
+        """Keep the summary and the newest turns that fit the history budget"""
+        prefix = ""
+        if summary:
+            # The summary stands in for older turns, so it is kept first
+            summary = truncate_to_tokens(summary, self.history_budget // 2)
+            prefix = f"Summary of the earlier conversation:\n{summary}\n\n"
+
+        entries = []
+        used = estimate_tokens(prefix)
+        for turn in reversed(turns):
+            entry = (
+                f"[{turn.get('timestamp', '')}]\n"
+                f"User: {turn.get('message', '')}\n"
+                f"AI: {turn.get('response', '')}\n\n"
+            )
+            tokens = estimate_tokens(entry)
+            if used + tokens > self.history_budget:
+                break
+            entries.append(entry)
+            used += tokens
+
+        if len(entries) < len(turns):
+            logger.info(
+                f"Chat history trimmed to {len(entries)} of {len(turns)} turns"
+            )
+
+        entries.reverse()
+        return prefix + "".join(entries), used
+
+    def _fit_chunks(self, chunks: List[Dict[str, Any]]):
+        """Keep distinct retrieved passages in rank order until the chunk budget is spent"""
+        passages = []
+        seen = set()
+        used = 0
+        for hit in chunks:
+            chunk = hit["content"]
+            fingerprint = " ".join(chunk.lower().split())
+            if not fingerprint or fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+
+            remaining = self.chunk_budget - used
+            if remaining <= 0:
+                break
+
+            tokens = estimate_tokens(chunk)
+            if tokens > remaining:
+                # Always include the best chunk, truncated if it alone is too long
+                if passages:
+                    continue
+                chunk = truncate_to_tokens(chunk, remaining)
+                tokens = estimate_tokens(chunk)
+
+            passages.append(chunk)
+            used += tokens
+
+        return passages, used
+
+
+# Global context builder instance
+context_builder = ContextBuilder()
@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Hash field holding each chunk's vector, per stored vector type. FLOAT32 keeps
+# the original field so full-precision vectors remain available for re-ranking.
+VECTOR_FIELDS = {
+    "FLOAT32": "embedding",
+    "FLOAT16": "embedding_f16",
+    "INT8": "embedding_i8",
+}
+
+
+def vector_field_spec(field: str, full_dim: int) -> Optional[Tuple[str, int]]:
+    """Vector type and dimension of a hash field named after VECTOR_FIELDS"""
+    base, _, dim = field.rpartition("_")
+    if not dim.isdigit():
+        base, dim = field, full_dim
+    for vector_type, name in VECTOR_FIELDS.items():
+        if name == base:
+            return vector_type, int(dim)
+    return None
+
+
+def encode_vector(vector: np.ndarray, vector_type: str = "FLOAT32") -> bytes:
+    """Serialize a vector for an index of the given type"""
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector_type == "FLOAT16":
+        return vector.astype(np.float16).tobytes()
+    if vector_type == "INT8":
+        # Cosine distance ignores scale, so a unit vector scaled to 127 suffices
+        norm = np.linalg.norm(vector) or 1.0
+        return np.clip(np.rint(vector / norm * 127), -127, 127).astype(np.int8).tobytes()
+    return vector.tobytes()
+
+
+def decode_vector(raw: bytes, vector_type: str = "FLOAT32") -> np.ndarray:
+    """Deserialize a stored vector as float32"""
+    dtype = {"FLOAT16": np.float16, "INT8": np.int8}.get(vector_type, np.float32)
+    return np.frombuffer(raw, dtype=dtype).astype(np.float32)
+
+
+class EmbeddingBatcher:
+    """Gather concurrent single-text embedding requests into batched provider calls"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], Awaitable[List[np.ndarray]]]):
+        self.embed_fn = embed_fn
+        # How long the first request of a batch waits for company, in seconds
+        self.window = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000
+        self.max_batch_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+        self.requests = 0
+        self.batches = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text, sharing a provider call with concurrent requests"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything pending as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Embed a batch and route each vector back to its waiting request"""
+        # Identical texts in one window are embedded once
+        positions: Dict[str, int] = {}
+        texts: List[str] = []
+        for text, _ in batch:
+            if text not in positions:
+                positions[text] = len(texts)
+                texts.append(text)
+
+        self.batches += 1
+        try:
+            vectors = await self.embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(
+                    f"Embedding provider returned {len(vectors)} vectors "
+                    f"for {len(texts)} texts"
+                )
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[positions[text]])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            # Every waiting request fails now instead of hanging until its timeout
+            logger.error(f"Batched embedding of {len(texts)} texts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class TokenBucket:
+    """Rate limiter holding up to `capacity` tokens, refilled at `rate` per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until the tokens are available and take them"""
+        if self.rate <= 0:
+            return
+        # Callers are served in order, so a large request isn't starved
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a provider error is worth retrying: rate limits, 5xx, network errors"""
+    if isinstance(error, ValueError):
+        return False
+    # google-genai errors carry .code, httpx status errors a response
+    code = getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if not isinstance(code, int) and response is not None:
+        code = getattr(response, "status_code", None)
+    if not isinstance(code, int):
+        return True
+    return code == 429 or code >= 500
+
+
+class EmbeddingScheduler:
+    """Embed large text lists for ingestion in concurrent, rate-limited batches.
+
+    Texts are split into provider-sized batches, up to EMBED_INGEST_CONCURRENCY
+    of which are in flight at once; a token bucket keeps this process under
+    EMBED_REQUESTS_PER_MINUTE. Transient failures are retried with jittered
+    exponential backoff.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Awaitable[List[np.ndarray]]]):
+        self.embed_fn = embed_fn
+        self.batch_size = int(os.getenv("EMBED_INGEST_BATCH_SIZE", "100"))
+        self.concurrency = int(os.getenv("EMBED_INGEST_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+        self.retry_base_delay = float(os.getenv("EMBED_RETRY_BASE_DELAY", "1.0"))
+        self.retry_max_delay = float(os.getenv("EMBED_RETRY_MAX_DELAY", "30"))
+        # 0 disables rate limiting
+        requests_per_minute = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "0"))
+        self.bucket = TokenBucket(requests_per_minute / 60, max(self.concurrency, 1))
+        self.batches = 0
+        self.retries = 0
+
+    async def stream(
+        self, texts: List[str]
+    ) -> AsyncIterator[Tuple[int, List[np.ndarray]]]:
+        """Yield (offset, vectors) per batch as batches finish, in any order"""
+        offsets = iter(range(0, len(texts), self.batch_size))
+        running: Dict[asyncio.Task, int] = {}
+
+        def start_next() -> bool:
+            offset = next(offsets, None)
+            if offset is None:
+                return False
+            batch = texts[offset : offset + self.batch_size]
+            running[asyncio.create_task(self._embed_batch(batch))] = offset
+            return True
+
+        try:
+            while len(running) < self.concurrency and start_next():
+                pass
+            while running:
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    offset = running.pop(task)
+                    vectors = task.result()
+                    start_next()
+                    yield offset, vectors
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                vectors = await self.embed_fn(texts)
+                self.batches += 1
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                delay = min(
+                    self.retry_max_delay, self.retry_base_delay * 2**attempt
+                ) * random.uniform(0.5, 1.0)
+                self.retries += 1
+                logger.warning(
+                    f"Embedding batch of {len(texts)} failed ({e}); "
+                    f"retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "retries": self.retries}
+
+
+class EmbeddingCache:
+    """Two-tier query embedding cache: in-process LRU in front of Redis"""
+
+    def __init__(self, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+        self.local_size = int(os.getenv("EMBED_CACHE_LOCAL_SIZE", "4096"))
+        self.local_ttl = int(os.getenv("EMBED_CACHE_LOCAL_TTL", "3600"))
+        self.redis_ttl = int(os.getenv("EMBED_CACHE_REDIS_TTL", str(7 * 24 * 3600)))
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._local: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+
+    def _key(self, text: str) -> str:
+        normalized = " ".join(text.lower().split())
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return f"embcache:{self.model}:{self.dim}:{digest}"
+
+    async def get(self, redis, text: str) -> Optional[np.ndarray]:
+        """Look up a text's embedding locally, then in Redis"""
+        key = self._key(text)
+
+        entry = self._local.get(key)
+        if entry is not None:
+            expires_at, vector = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return vector
+            del self._local[key]
+
+        try:
+            raw = await redis.get(key) if redis is not None else None
+        except Exception as e:
+            logger.error(f"Failed to read embedding cache: {e}")
+            raw = None
+
+        if raw is not None and len(raw) == self.dim * 4:
+            vector = np.frombuffer(raw, dtype=np.float32)
+            self._put_local(key, vector)
+            self.redis_hits += 1
+            return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, redis, text: str, vector: np.ndarray):
+        """Store a text's embedding in both tiers"""
+        key = self._key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._put_local(key, vector)
+
+        if redis is None:
+            return
+        try:
+            await redis.setex(key, self.redis_ttl, vector.tobytes())
+        except Exception as e:
+            logger.error(f"Failed to write embedding cache: {e}")
+
+    def _put_local(self, key: str, vector: np.ndarray):
+        self._local[key] = (time.monotonic() + self.local_ttl, vector)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for both tiers"""
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_size": len(self._local),
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Characters per stored chunk
+CHUNK_SIZE = 500
+# Characters a chunk repeats from the end of the previous one; split_text
+# cuts chunks without overlap
+CHUNK_OVERLAP = 0
+
+
+def split_text(text: str) -> List[str]:
+    """Split text into chunks of at most CHUNK_SIZE characters, cutting at whitespace"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + CHUNK_SIZE
+        if end < len(text):
+            # Cut at the last whitespace so no word is split across chunks
+            cut = max(text.rfind(space, start + 1, end + 1) for space in " \n\t")
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+
+def count_pages(path: str) -> int:
+    with open(path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_chunks(
+    path: str, start: int = 0, end: Optional[int] = None
+) -> Tuple[List[str], int]:
+    """Split the text of pages [start, end) into ~500 character chunks.
+
+    Returns the chunks and the PDF's total page count. PyPDF2 still parses
+    the whole page tree, so memory grows with the document, not just the range.
+    """
+    with open(path, "rb") as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        num_pages = len(pdf_reader.pages)
+
+        chunks = []
+        for page_num in range(start, min(end or num_pages, num_pages)):
+            chunks.extend(split_text(pdf_reader.pages[page_num].extract_text()))
+
+    return chunks, num_pages
+
+
+class PdfExtractor:
+    """PDF text extraction in a bounded process pool, split by page range.
+
+    Parsing is CPU-bound and holds the GIL, so it runs in child processes to
+    keep the caller's event loop responsive; large documents are spread over
+    several processes INGEST_PAGES_PER_TASK pages at a time.
+    """
+
+    def __init__(self):
+        self.processes = int(os.getenv("INGEST_EXTRACT_PROCESSES", "0")) or (
+            os.cpu_count() or 1
+        )
+        self.pages_per_task = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+            logger.info(f"Started PDF extraction pool with {self.processes} processes")
+        return self._pool
+
+    async def extract(self, path: str) -> Tuple[List[str], int]:
+        """Chunks of a whole PDF file in page order, and its page count"""
+        loop = asyncio.get_running_loop()
+        num_pages = await loop.run_in_executor(self.pool, count_pages, path)
+
+        ranges = [
+            (start, start + self.pages_per_task)
+            for start in range(0, num_pages, self.pages_per_task)
+        ]
+        parts = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.pool, extract_chunks, path, start, end)
+                for start, end in ranges
+            )
+        )
+        return [chunk for chunks, _ in parts for chunk in chunks], num_pages
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+# Global PDF extractor instance
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,365 @@
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app.extraction import pdf_extractor
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Stream of pending ingestion jobs, its consumer group and dead-letter stream
+INGEST_STREAM = "ingest:jobs"
+INGEST_GROUP = "ingesters"
+INGEST_DEAD_STREAM = "ingest:jobs:dead"
+# Buffer size for copying uploads to the upload directory
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadLimitMiddleware:
+    """Reject upload requests with a body over INGEST_MAX_UPLOAD_MB.
+
+    Checked against Content-Length up front and counted on the receive stream,
+    so an oversized upload is cut off while the client is still sending it
+    rather than after it has been spooled.
+    """
+
+    def __init__(self, app, path_prefix: str = "/v1/upload"):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_upload_mb = int(os.getenv("INGEST_MAX_UPLOAD_MB", "50"))
+        self.max_bytes = self.max_upload_mb * 1024 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds the {self.max_upload_mb} MB limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(
+                scope, receive, send
+            )
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while FastAPI parses the form, so it becomes a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class IngestionQueue:
+    """PDF ingestion jobs on a Redis Stream, processed by separate worker processes.
+
+    A job's PDF is saved in INGEST_UPLOAD_DIR, which workers must share with
+    the API (same host or a shared volume), until its chunks are stored. Failed
+    deliveries stay pending and are retried after INGEST_RETRY_DELAY_MS, ones
+    abandoned by a crashed worker are reclaimed after INGEST_CLAIM_IDLE_MS, and
+    after INGEST_MAX_ATTEMPTS they go to the dead-letter stream.
+    """
+
+    def __init__(self):
+        self.max_attempts = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+        # Idle time before another worker takes over an abandoned delivery
+        self.claim_idle_ms = int(os.getenv("INGEST_CLAIM_IDLE_MS", "600000"))
+        self.retry_delay_ms = int(os.getenv("INGEST_RETRY_DELAY_MS", "30000"))
+        self.block_ms = int(os.getenv("INGEST_BLOCK_MS", "5000"))
+        self.job_ttl = int(os.getenv("INGEST_JOB_TTL", str(7 * 24 * 3600)))
+        self.upload_dir = os.getenv("INGEST_UPLOAD_DIR") or os.path.join(
+            tempfile.gettempdir(), "qyra-uploads"
+        )
+
+    def _job_key(self, job_id: str) -> str:
+        return f"ingest:job:{job_id}"
+
+    async def enqueue(self, redis, client_id: str, filename: str, file) -> str:
+        """Save an uploaded PDF to the upload directory and queue it for ingestion.
+
+        `file` is a Starlette UploadFile, already spooled to disk; it is copied
+        in fixed-size pieces. Returns the job id.
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+
+        path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+        await asyncio.to_thread(self._save, file.file, path)
+        try:
+            pipe = redis.redis.pipeline()
+            pipe.hset(
+                self._job_key(job_id),
+                mapping={
+                    "job_id": job_id,
+                    "client_id": client_id,
+                    "filename": filename,
+                    "path": path,
+                    "size": os.path.getsize(path),
+                    "status": "queued",
+                    "attempts": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                },
+            )
+            pipe.expire(self._job_key(job_id), self.job_ttl)
+            pipe.xadd(INGEST_STREAM, {"job_id": job_id})
+            await pipe.execute()
+        except Exception:
+            self._remove_upload(path)
+            raise
+
+        logger.info(f"Queued ingestion job {job_id} for {filename} ({client_id})")
+        return job_id
+
+    def _save(self, source, path: str):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        source.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+
+    def _remove_upload(self, path: Optional[str]):
+        if not path:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep_uploads(self):
+        """Remove uploads left behind by jobs that expired unprocessed"""
+        if not os.path.isdir(self.upload_dir):
+            return
+        cutoff = time.time() - self.job_ttl
+        for entry in os.scandir(self.upload_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    async def get_job(self, redis, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status and progress of a job"""
+        job = await redis.redis.hgetall(self._job_key(job_id))
+        if not job:
+            return None
+
+        job.pop("path", None)  # Internal to the workers
+        for field in ["size", "attempts", "pages", "chunks_count", "file_id"]:
+            if field in job:
+                job[field] = int(job[field])
+        return job
+
+    async def _update(self, redis, job_id: str, **fields: Any):
+        fields["updated_at"] = datetime.now().isoformat()
+        await redis.redis.hset(self._job_key(job_id), mapping=fields)
+
+    async def ensure_group(self, redis):
+        """Create the consumer group (and stream) if they don't exist"""
+        try:
+            await redis.redis.xgroup_create(
+                INGEST_STREAM, INGEST_GROUP, id="0", mkstream=True
+            )
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def run(self, redis, consumer: Optional[str] = None):
+        """Process jobs until cancelled, reclaiming deliveries abandoned by others"""
+        consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        await self.ensure_group(redis)
+        await asyncio.to_thread(self.sweep_uploads)
+        logger.info(f"Ingestion consumer {consumer} started")
+
+        while True:
+            try:
+                # Retries and crashed workers' jobs first, then new ones
+                _, claimed, *_ = await redis.redis.xautoclaim(
+                    INGEST_STREAM,
+                    INGEST_GROUP,
+                    consumer,
+                    min_idle_time=self.claim_idle_ms,
+                    count=1,
+                )
+                entries = claimed
+                if not entries:
+                    response = await redis.redis.xreadgroup(
+                        INGEST_GROUP,
+                        consumer,
+                        {INGEST_STREAM: ">"},
+                        count=1,
+                        block=self.block_ms,
+                    )
+                    entries = response[0][1] if response else []
+
+                for message_id, data in entries:
+                    if data:
+                        await self._handle(
+                            redis, consumer, message_id, data.get("job_id")
+                        )
+                    else:
+                        # Entry deleted from the stream while pending
+                        await redis.redis.xack(
+                            INGEST_STREAM, INGEST_GROUP, message_id
+                        )
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion consumer {consumer} error: {e}")
+                await asyncio.sleep(1)
+
+    async def _handle(
+        self, redis, consumer: str, message_id: str, job_id: Optional[str]
+    ):
+        """Process one delivery; acknowledge it unless it should be retried"""
+        job = await self.get_job(redis, job_id) if job_id else None
+        if not job or job["status"] in ("done", "failed"):
+            await redis.redis.xack(INGEST_STREAM, INGEST_GROUP, message_id)
+            return
+
+        attempts = await redis.redis.hincrby(self._job_key(job_id), "attempts", 1)
+        if attempts > self.max_attempts:
+            await self._dead_letter(redis, message_id, job, job.get("error", ""))
+            return
+
+        keepalive = asyncio.create_task(
+            self._keep_claimed(redis, consumer, message_id)
+        )
+        try:
+            await self._process(redis, job)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} attempt {attempts} failed: {e}")
+            if attempts >= self.max_attempts:
+                await self._dead_letter(redis, message_id, job, str(e))
+            else:
+                await self._update(redis, job_id, status="retrying", error=str(e))
+                await self._schedule_retry(redis, consumer, message_id)
+            return
+        finally:
+            keepalive.cancel()
+
+        pipe = redis.redis.pipeline()
+        pipe.xack(INGEST_STREAM, INGEST_GROUP, message_id)
+        pipe.xdel(INGEST_STREAM, message_id)
+        await pipe.execute()
+
+    async def _schedule_retry(self, redis, consumer: str, message_id: str):
+        """Leave a delivery pending, backdated so it's reclaimed after the retry delay"""
+        try:
+            await redis.redis.xclaim(
+                INGEST_STREAM,
+                INGEST_GROUP,
+                consumer,
+                min_idle_time=0,
+                message_ids=[message_id],
+                idle=max(self.claim_idle_ms - self.retry_delay_ms, 0),
+                justid=True,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to schedule retry of {message_id}: {e}")
+
+    async def _keep_claimed(self, redis, consumer: str, message_id: str):
+        """Reset a delivery's idle time so long jobs aren't reclaimed mid-run"""
+        while True:
+            await asyncio.sleep(self.claim_idle_ms / 3000)
+            try:
+                await redis.redis.xclaim(
+                    INGEST_STREAM,
+                    INGEST_GROUP,
+                    consumer,
+                    min_idle_time=0,
+                    message_ids=[message_id],
+                    justid=True,
+                )
+            except Exception as e:
+                logger.warning(f"Failed to renew claim on {message_id}: {e}")
+
+    async def _process(self, redis, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        if "file_id" in job:
+            # Stored by an earlier attempt that failed to acknowledge
+            await self._update(redis, job_id, status="done")
+            return
+
+        path = await redis.redis.hget(self._job_key(job_id), "path")
+        if not path or not os.path.exists(path):
+            raise ValueError(
+                f"Uploaded file {path} not found; is INGEST_UPLOAD_DIR shared?"
+            )
+
+        await self._update(redis, job_id, status="processing", stage="extracting")
+        # PDF parsing is CPU-bound; it runs in a process pool, not on this loop
+        chunks, num_pages = await pdf_extractor.extract(path)
+        if not chunks:
+            await self._update(
+                redis,
+                job_id,
+                status="failed",
+                error="No text content found in PDF",
+                pages=num_pages,
+            )
+            self._remove_upload(path)
+            return
+
+        await self._update(
+            redis,
+            job_id,
+            stage="embedding",
+            pages=num_pages,
+            chunks_count=len(chunks),
+        )
+        filemeta = {
+            "filename": job["filename"],
+            "size": job["size"],
+            "num_pages": num_pages,
+            "uploaded_at": job["created_at"],
+        }
+        file_id = await redis.store_chunks(job["client_id"], chunks, filemeta)
+
+        await self._update(
+            redis, job_id, status="done", stage="", error="", file_id=file_id
+        )
+        self._remove_upload(path)
+        logger.info(f"Ingestion job {job_id} stored {len(chunks)} chunks")
+
+    async def _dead_letter(
+        self, redis, message_id: str, job: Dict[str, Any], error: str
+    ):
+        """Give up on a job and keep it on the dead-letter stream for inspection"""
+        job_id = job["job_id"]
+        pipe = redis.redis.pipeline()
+        pipe.xadd(
+            INGEST_DEAD_STREAM,
+            {"job_id": job_id, "client_id": job["client_id"], "error": error},
+        )
+        pipe.xack(INGEST_STREAM, INGEST_GROUP, message_id)
+        pipe.xdel(INGEST_STREAM, message_id)
+        await pipe.execute()
+        self._remove_upload(await redis.redis.hget(self._job_key(job_id), "path"))
+        await self._update(redis, job_id, status="failed", stage="", error=error)
+        logger.error(f"Ingestion job {job_id} moved to dead-letter stream: {error}")
+
+
+# Global ingestion queue instance
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+from app.models import LLMError
+from app.providers import close_providers, get_provider
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class LLMClient:
+    """Process-wide async LLM client with bounded in-flight concurrency"""
+
+    def __init__(self):
+        # Max generations in flight per worker; extra callers wait in the queue
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        # Seconds a caller may wait for a free slot before giving up
+        self.queue_timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+        # Default per-call deadline in seconds
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        """Close pooled provider connections"""
+        await close_providers()
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Wait for a free concurrency slot, bounded by the queue timeout"""
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMError(
+                f"LLM queue wait exceeded {self.queue_timeout}s "
+                f"({self.in_flight} in flight, {self.waiting} waiting)"
+            )
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def generate(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        provider: Optional[str] = None,
+    ) -> str:
+        """Generate a complete response for a prompt"""
+        timeout = timeout or self.request_timeout
+        backend = get_provider(provider)
+        async with self._slot():
+            try:
+                return await asyncio.wait_for(backend.generate(prompt), timeout)
+            except asyncio.TimeoutError:
+                raise LLMError(f"LLM generation exceeded {timeout}s deadline")
+
+    async def stream(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        provider: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Stream response text chunks for a prompt under a single deadline"""
+        timeout = timeout or self.request_timeout
+        backend = get_provider(provider)
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            try:
+                chunks = backend.stream(prompt).__aiter__()
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except asyncio.TimeoutError:
+                raise LLMError(f"LLM stream exceeded {timeout}s deadline")
+
+
+# Global LLM client instance
+llm_client = LLMClient()
+
+
+async def get_llm() -> LLMClient:
+    """Dependency to get LLM client"""
+    return llm_client
+
+
+async def close_llm():
+    """Release the shared LLM client and its providers"""
+    await llm_client.close()
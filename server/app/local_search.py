@@ -0,0 +1,200 @@
+import asyncio
+import os
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+import numpy as np
+from redis.commands.search.document import Document
+from app.embeddings import decode_vector
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Chunk fields loaded alongside the vectors, as returned by RediSearch queries
+DOC_FIELDS = ["content", "filename", "chunk_index", "file_id"]
+
+
+class TenantMatrix:
+    """L2-normalized chunk vectors of one client at one corpus version"""
+
+    def __init__(self, version: int, vectors: np.ndarray, docs: List[Dict[str, str]]):
+        self.version = version
+        self.vectors = vectors
+        self.docs = docs
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+
+class LocalSearch:
+    """Brute-force KNN in process memory for clients with small corpora"""
+
+    def __init__(self):
+        # Largest corpus searched locally; 0 sends every search to RediSearch
+        self.max_chunks = int(os.getenv("LOCAL_SEARCH_MAX_CHUNKS", "2000"))
+        # Memory budget for cached matrices across all clients
+        self.max_bytes = int(os.getenv("LOCAL_SEARCH_MAX_MB", "256")) * 1024 * 1024
+        self._matrices: "OrderedDict[str, TenantMatrix]" = OrderedDict()
+        self._loading: Dict[tuple, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.loads = 0
+
+    def eligible(self, corpus: Dict[str, int]) -> bool:
+        """Whether a corpus is small enough to search in process"""
+        return 0 < corpus["chunk_count"] <= self.max_chunks
+
+    async def search(
+        self,
+        redis,
+        client_id: str,
+        version: int,
+        query_embedding: np.ndarray,
+        top_k: int,
+    ) -> List[Document]:
+        """Top-k chunks by cosine similarity, loading the client's vectors if stale"""
+        matrix = await self._get(redis, client_id, version)
+        if not len(matrix.docs):
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)[: matrix.vectors.shape[1]]
+        query = query / (np.linalg.norm(query) or 1.0)
+        similarities = matrix.vectors @ query
+
+        k = min(top_k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+
+        return [
+            Document(score=str(1 - float(similarities[i])), **matrix.docs[i])
+            for i in top
+        ]
+
+    def invalidate(self, client_id: str):
+        """Drop a client's cached vectors"""
+        matrix = self._matrices.pop(client_id, None)
+        if matrix:
+            self._bytes -= matrix.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._matrices),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+    async def _get(self, redis, client_id: str, version: int) -> TenantMatrix:
+        matrix = self._matrices.get(client_id)
+        if matrix and matrix.version == version:
+            self._matrices.move_to_end(client_id)
+            self.hits += 1
+            return matrix
+
+        # Concurrent searches of a stale client share one load
+        key = (client_id, version)
+        if key not in self._loading:
+            self._loading[key] = asyncio.create_task(
+                self._load(redis, client_id, version)
+            )
+        try:
+            return await asyncio.shield(self._loading[key])
+        finally:
+            if key in self._loading and self._loading[key].done():
+                del self._loading[key]
+
+    async def _load(self, redis, client_id: str, version: int) -> TenantMatrix:
+        """Read every chunk vector of a client from its file records"""
+        # Same replica choice as the corpus version read by semantic_search
+        conn = redis.tenant(client_id, "semantic_search")
+        file_ids = list(await conn.smembers(f"files:{client_id}"))
+        pipe = conn.pipeline(transaction=False)
+        for file_id in file_ids:
+            pipe.hget(f"file:{client_id}:{file_id}", "chunk_count")
+        chunk_counts = await pipe.execute() if file_ids else []
+
+        keys = [
+            f"chunk:{client_id}:{file_id}:{idx}"
+            for file_id, count in zip(file_ids, chunk_counts)
+            for idx in range(int(count or 0))
+        ]
+        fields = DOC_FIELDS + ["embedding", redis.vector_field]
+        pipe = redis.tenant_bytes(client_id, "semantic_search").pipeline(
+            transaction=False
+        )
+        for key in keys:
+            pipe.hmget(key, fields)
+        rows = await pipe.execute() if keys else []
+
+        docs, full, reduced = [], [], []
+        for key, row in zip(keys, rows):
+            if row[0] is None:
+                continue  # Deleted while loading
+            docs.append(
+                {
+                    "id": key,
+                    **{
+                        name: (value or b"").decode()
+                        for name, value in zip(DOC_FIELDS, row)
+                    },
+                }
+            )
+            raw_full, raw_reduced = row[len(DOC_FIELDS)], row[len(DOC_FIELDS) + 1]
+            full.append(
+                decode_vector(raw_full)
+                if raw_full and len(raw_full) == redis.vector_dim * 4
+                else None
+            )
+            reduced.append(
+                decode_vector(raw_reduced, redis.vector_type) if raw_reduced else None
+            )
+
+        # Use full vectors unless some chunks only kept the indexed ones
+        if all(vector is not None for vector in full):
+            vectors = full
+        else:
+            vectors = [
+                r if r is not None else (f[: redis.index_dim] if f is not None else None)
+                for f, r in zip(full, reduced)
+            ]
+            keep = [i for i, vector in enumerate(vectors) if vector is not None]
+            docs = [docs[i] for i in keep]
+            vectors = [vectors[i] for i in keep]
+
+        dim = redis.vector_dim if vectors is full else redis.index_dim
+        matrix = (
+            np.stack(vectors).astype(np.float32)
+            if vectors
+            else np.zeros((0, dim), dtype=np.float32)
+        )
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        tenant = TenantMatrix(version, matrix, docs)
+        self._store(client_id, tenant)
+        self.loads += 1
+        logger.info(
+            f"Loaded {len(docs)} chunk vectors for client {client_id} (v{version})"
+        )
+        return tenant
+
+    def _store(self, client_id: str, tenant: TenantMatrix):
+        """Cache a client's matrix, evicting least recently used ones over budget"""
+        current = self._matrices.get(client_id)
+        if current and current.version > tenant.version:
+            return  # A newer load finished first
+
+        self.invalidate(client_id)
+        self._matrices[client_id] = tenant
+        self._bytes += tenant.nbytes
+
+        while self._bytes > self.max_bytes and len(self._matrices) > 1:
+            _, evicted = self._matrices.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+
+# Global local search instance
+local_search = LocalSearch()
@@ -0,0 +1,120 @@
+import os
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from app.singleflight import RELEASE_LOCK_SCRIPT
+from app.utils import ERROR_RESPONSE_PREFIX, summarize_conversation
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class SessionMemory:
+    """Rolling per-session summary that replaces old turns in the prompt"""
+
+    def __init__(self):
+        # Unsummarized turns allowed before older ones are compacted
+        self.summarize_after = int(os.getenv("MEMORY_SUMMARIZE_AFTER_TURNS", "10"))
+        # Most recent turns always kept verbatim
+        self.recent_turns = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+        # Fallback history depth for sessions without a summary record
+        self.history_limit = 50
+        self.ttl = 7 * 24 * 3600
+
+    def _key(self, client_id: str, session_id: str) -> str:
+        return f"session_summary:{client_id}:{session_id}"
+
+    async def load(self, redis, client_id: str, session_id: str) -> Dict[str, Any]:
+        """Get the session summary plus the turns it doesn't cover yet"""
+        record = await redis.tenant(client_id).hgetall(
+            self._key(client_id, session_id)
+        )
+
+        limit = self.history_limit
+        if record:
+            limit = int(record.get("total_turns", 0)) - int(
+                record.get("summarized_turns", 0)
+            )
+
+        turns = []
+        if limit > 0:
+            turns = await redis.get_chat_history(client_id, session_id, limit=limit)
+
+        return {"summary": record.get("summary", ""), "turns": turns}
+
+    async def update(
+        self,
+        redis,
+        client_id: str,
+        session_id: str,
+        provider: Optional[str] = None,
+    ):
+        """Count a stored turn and compact older turns once the session grows,
+        summarizing with the client's LLM provider"""
+        key = self._key(client_id, session_id)
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        conn = redis.tenant(client_id)
+        try:
+            total_turns = await conn.hincrby(key, "total_turns", 1)
+            await conn.expire(key, self.ttl)
+            if total_turns == 1:
+                # Sessions older than the record start with their existing turns,
+                # counted on the primary, which already has the turn just stored
+                history = await redis.get_chat_history(
+                    client_id, session_id, limit=self.history_limit, read=None
+                )
+                if len(history) > 1:
+                    total_turns = await conn.hincrby(
+                        key, "total_turns", len(history) - 1
+                    )
+
+            summarized_turns = int(
+                await conn.hget(key, "summarized_turns") or 0
+            )
+            pending = total_turns - summarized_turns
+            if pending <= self.summarize_after + self.recent_turns:
+                return
+
+            # One compaction per session at a time
+            if not await conn.set(lock_key, token, nx=True, ex=60):
+                return
+
+            try:
+                turns = await redis.get_chat_history(
+                    client_id, session_id, limit=pending, read=None
+                )
+                to_summarize = turns[: -self.recent_turns]
+                if not to_summarize:
+                    return
+
+                summary = await conn.hget(key, "summary") or ""
+                new_summary = await summarize_conversation(
+                    summary, to_summarize, provider
+                )
+                if not new_summary or new_summary.startswith(ERROR_RESPONSE_PREFIX):
+                    return
+
+                await conn.hset(
+                    key,
+                    mapping={
+                        "summary": new_summary,
+                        "summarized_turns": summarized_turns + len(to_summarize),
+                        "updated_at": datetime.now().isoformat(),
+                    },
+                )
+                logger.info(
+                    f"Compacted {len(to_summarize)} turns into summary for session {session_id}"
+                )
+            finally:
+                await conn.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+        except Exception as e:
+            logger.error(f"Failed to update session memory: {e}")
+
+
+# Global session memory instance
+session_memory = SessionMemory()
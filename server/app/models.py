@@ -1,11 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from datetime import datetime
 
 class RedisError(Exception):
     pass
 
 
+class LLMError(Exception):
+    pass
+
+
 class ChatMessage(BaseModel):
     message: str = Field(..., max_length=1000)
     client_id: str = Field(..., min_length=1)
@@ -53,6 +57,14 @@ class ClientConfig(BaseModel):
     welcome_message: str = "Hello! How can I help you today?"
     enabled: bool = True
     rate_limit: int = 10
+    # LLM backend for this client ("gemini" or "ollama"); None uses LLM_PROVIDER
+    llm_provider: Optional[Literal["gemini", "ollama"]] = None
+    # "vector" for KNN only, "hybrid" to fuse full-text and KNN rankings
+    retrieval_mode: Literal["vector", "hybrid"] = "vector"
+    hybrid_text_weight: float = 1.0
+    hybrid_vector_weight: float = 1.0
+    # Minimum cosine similarity of retrieved chunks; None uses RETRIEVAL_MIN_SIMILARITY
+    min_similarity: Optional[float] = None
 
 class OnboardingRequest(BaseModel):
     user_id: str
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import numpy as np
+from app.memory import session_memory
+from app.models import ClientConfig, RedisError
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class ChatInputs:
+    """Lookups for one chat turn, running concurrently as independent stages"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.degraded: List[str] = []
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def config(self) -> Optional[ClientConfig]:
+        return await self.tasks["config"]
+
+    async def embedding(self) -> Optional[np.ndarray]:
+        """Query embedding, or None if retrieval was served without one"""
+        task = self.tasks["embedding"]
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+
+    async def chunks(self) -> List[Dict[str, Any]]:
+        return await self.tasks["chunks"]
+
+    async def history(self) -> Dict[str, Any]:
+        return await self.tasks["history"]
+
+    def cancel(self):
+        """Stop stages whose results are no longer needed"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def server_timing(self) -> str:
+        """Stage timings formatted for a Server-Timing header"""
+        return ", ".join(
+            f"{name};dur={duration}" for name, duration in self.timings.items()
+        )
+
+
+class ChatPipeline:
+    """Run config, embedding, retrieval and history lookups with per-stage budgets"""
+
+    def __init__(self):
+        # Per-stage budgets in seconds
+        self.config_timeout = float(os.getenv("PIPELINE_CONFIG_TIMEOUT", "1.0"))
+        self.embedding_timeout = float(os.getenv("PIPELINE_EMBEDDING_TIMEOUT", "2.0"))
+        self.retrieval_timeout = float(os.getenv("PIPELINE_RETRIEVAL_TIMEOUT", "2.0"))
+        self.history_timeout = float(os.getenv("PIPELINE_HISTORY_TIMEOUT", "0.5"))
+        # Last config seen per client, served if the config lookup misses its
+        # budget; least recently used entries are evicted and old ones expire
+        self.config_fallback_size = int(
+            os.getenv("PIPELINE_CONFIG_FALLBACK_SIZE", "1000")
+        )
+        self.config_fallback_ttl = float(
+            os.getenv("PIPELINE_CONFIG_FALLBACK_TTL", "300")
+        )
+        self._last_configs: "OrderedDict[str, Tuple[float, ClientConfig]]" = (
+            OrderedDict()
+        )
+        self._listener: Optional[asyncio.Task] = None
+
+    def start(
+        self, redis, client_id: str, message: str, session_id: str
+    ) -> ChatInputs:
+        """Start all stages for a chat turn without waiting on any of them"""
+        inputs = ChatInputs()
+
+        inputs.tasks["config"] = asyncio.create_task(
+            self._load_config(redis, client_id, inputs)
+        )
+        inputs.tasks["embedding"] = asyncio.create_task(
+            self._stage(
+                inputs,
+                "embedding",
+                redis.embed_query(message),
+                self.embedding_timeout,
+                None,
+            )
+        )
+        inputs.tasks["chunks"] = asyncio.create_task(
+            self._retrieve(redis, client_id, message, inputs)
+        )
+        inputs.tasks["history"] = asyncio.create_task(
+            self._stage(
+                inputs,
+                "history",
+                session_memory.load(redis, client_id, session_id),
+                self.history_timeout,
+                {"summary": "", "turns": []},
+            )
+        )
+        return inputs
+
+    async def _stage(
+        self,
+        inputs: ChatInputs,
+        name: str,
+        coro: Awaitable[Any],
+        timeout: float,
+        fallback: Any,
+    ) -> Any:
+        """Await a stage within its budget, falling back if it is late or fails"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat stage '{name}' exceeded {timeout}s budget")
+            inputs.degraded.append(name)
+            return fallback
+        except RedisError:
+            raise
+        except Exception as e:
+            logger.error(f"Chat stage '{name}' failed: {e}")
+            inputs.degraded.append(name)
+            return fallback
+        finally:
+            inputs.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _load_config(
+        self, redis, client_id: str, inputs: ChatInputs
+    ) -> Optional[ClientConfig]:
+        """Load client config, serving the last known config if the lookup is late"""
+        marker = object()
+        config = await self._stage(
+            inputs,
+            "config",
+            redis.get_client_config(client_id),
+            self.config_timeout,
+            marker,
+        )
+
+        if config is marker:
+            fallback = self._last_config(client_id)
+            if fallback is None:
+                raise RedisError("Client config lookup exceeded its budget")
+            return fallback
+
+        self._remember_config(client_id, config)
+        return config
+
+    def _last_config(self, client_id: str) -> Optional[ClientConfig]:
+        entry = self._last_configs.get(client_id)
+        if entry is None:
+            return None
+        stored_at, config = entry
+        if time.monotonic() - stored_at > self.config_fallback_ttl:
+            del self._last_configs[client_id]
+            return None
+        self._last_configs.move_to_end(client_id)
+        return config
+
+    def _remember_config(self, client_id: str, config: Optional[ClientConfig]):
+        if not config:
+            self._last_configs.pop(client_id, None)
+            return
+        self._last_configs[client_id] = (time.monotonic(), config)
+        self._last_configs.move_to_end(client_id)
+        while len(self._last_configs) > self.config_fallback_size:
+            self._last_configs.popitem(last=False)
+
+    def listen(self, redis):
+        """Keep fallback configs current from the config update channel"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._follow_config_updates(redis))
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _follow_config_updates(self, redis):
+        while True:
+            pubsub = redis.redis.pubsub()
+            try:
+                await pubsub.psubscribe("config_updates:*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    client_id = message["channel"].split(":", 1)[1]
+                    if client_id not in self._last_configs:
+                        continue
+                    try:
+                        config = ClientConfig(**json.loads(message["data"]))
+                    except Exception:
+                        config = None
+                    self._remember_config(client_id, config)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Updates missed meanwhile are bounded by the fallback TTL
+                logger.error(f"Config update listener failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _retrieve(
+        self, redis, client_id: str, message: str, inputs: ChatInputs
+    ) -> List[Dict[str, Any]]:
+        """Search the client's documents once the query embedding is ready.
+
+        Search gets whatever the embedding left of the two stages' combined
+        budget, and HNSW EF_RUNTIME is sized to that remaining time.
+        """
+        deadline = inputs.started + self.embedding_timeout + self.retrieval_timeout
+
+        # Retrieval options such as hybrid search come from the client config
+        try:
+            config = await inputs.tasks["config"]
+        except Exception:
+            config = None
+
+        # A repeated query is served from the retrieval cache without embedding it
+        cached = await redis.cached_search(client_id, message, config=config)
+        if cached is not None:
+            inputs.tasks["embedding"].cancel()
+            return cached
+
+        query_embedding = await inputs.tasks["embedding"]
+        if query_embedding is None:
+            return []
+
+        remaining = max(deadline - time.perf_counter(), 0.0)
+        return await self._stage(
+            inputs,
+            "retrieval",
+            redis.semantic_search(
+                client_id,
+                message,
+                query_embedding=query_embedding,
+                config=config,
+                ef_runtime=redis.ef_runtime_for_budget(remaining, 3),
+                cache_lookup=False,
+            ),
+            remaining,
+            [],
+        )
+
+
+# Global chat pipeline instance
+chat_pipeline = ChatPipeline()
@@ -0,0 +1,171 @@
+import json
+import os
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+from dotenv import load_dotenv
+import httpx
+import numpy as np
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class LLMProvider(ABC):
+    """Interface for text generation and embedding backends"""
+
+    name = ""
+    model = ""
+    embedding_model = ""
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str: ...
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Response text pieces as they are generated, from an async generator"""
+
+    @abstractmethod
+    async def embed(self, texts: List[str], dim: int) -> List[np.ndarray]: ...
+
+    async def close(self):
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini API, sharing one client and its connection pool"""
+
+    name = "gemini"
+
+    def __init__(self):
+        self.model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+        self.embedding_model = os.getenv(
+            "GEMINI_EMBEDDING_MODEL", "gemini-embedding-001"
+        )
+        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=self.model, contents=prompt
+        )
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model, contents=prompt
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def embed(self, texts: List[str], dim: int) -> List[np.ndarray]:
+        response = await self.client.aio.models.embed_content(
+            model=self.embedding_model,
+            contents=texts,
+            config=types.EmbedContentConfig(output_dimensionality=dim),
+        )
+        return [
+            np.array(embedding.values, dtype=np.float32)
+            for embedding in response.embeddings
+        ]
+
+
+class OllamaProvider(LLMProvider):
+    """Local Ollama-compatible HTTP server over pooled keep-alive connections"""
+
+    name = "ollama"
+
+    def __init__(self):
+        self.base_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
+        self.model = os.getenv("OLLAMA_MODEL", "gemma3:1b")
+        self.embedding_model = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+        max_connections = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            # Deadlines are enforced by LLMClient, not per socket read
+            timeout=httpx.Timeout(None, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.post(
+            "/api/generate",
+            json={"model": self.model, "prompt": prompt, "stream": False},
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            "/api/generate",
+            json={"model": self.model, "prompt": prompt, "stream": True},
+        ) as response:
+            response.raise_for_status()
+            # Ollama streams one JSON object per line
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+
+    async def embed(self, texts: List[str], dim: int) -> List[np.ndarray]:
+        response = await self.client.post(
+            "/api/embed", json={"model": self.embedding_model, "input": texts}
+        )
+        response.raise_for_status()
+
+        embeddings = []
+        for values in response.json()["embeddings"]:
+            if len(values) < dim:
+                raise ValueError(
+                    f"{self.embedding_model} returned {len(values)} dims, index needs {dim}"
+                )
+            embeddings.append(np.array(values[:dim], dtype=np.float32))
+        return embeddings
+
+    async def close(self):
+        await self.client.aclose()
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "ollama": OllamaProvider,
+}
+
+_instances: Dict[str, LLMProvider] = {}
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """Get the shared provider instance by name, defaulting to LLM_PROVIDER"""
+    name = (name or os.getenv("LLM_PROVIDER", "gemini")).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+
+    if name not in _instances:
+        _instances[name] = PROVIDERS[name]()
+    return _instances[name]
+
+
+def get_embedding_provider() -> LLMProvider:
+    """Provider for embeddings, fixed per deployment since it defines the vector space"""
+    return get_provider(os.getenv("EMBEDDING_PROVIDER", "gemini"))
+
+
+async def close_providers():
+    """Close pooled connections of all providers created so far"""
+    for provider in list(_instances.values()):
+        try:
+            await provider.close()
+        except Exception as e:
+            logger.error(f"Failed to close {provider.name} provider: {e}")
+    _instances.clear()
@@ -1,64 +1,296 @@
+import asyncio
+import fnmatch
 import redis.asyncio as redis
 import json
+import re
 import numpy as np
 from dotenv import load_dotenv
-from google import genai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 import os
 import logging
 from datetime import datetime, timedelta
 from app.models import RedisError, ClientConfig
+from app.embeddings import (
+    VECTOR_FIELDS,
+    vector_field_spec,
+    EmbeddingBatcher,
+    EmbeddingCache,
+    EmbeddingScheduler,
+    decode_vector,
+    encode_vector,
+)
+from app.extraction import CHUNK_OVERLAP
+from app.local_search import local_search
+from app.providers import get_embedding_provider
+from app.replicas import ReplicaRouter
+from app.retrieval_cache import RetrievalCache
+from app.sharding import DEFAULT_SHARD, TENANT_SHARDS_KEY, ShardRouter
 from redis.commands.search.field import VectorField, TextField, TagField
 from redis.commands.search.index_definition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
-from google.genai import types
+from redis.commands.search.result import Result
 from clerk_backend_api import Clerk
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Alias that all chunk searches go through; it points at a versioned index
+CHUNKS_INDEX = "chunks_idx"
+# Candidates fetched per ranking in hybrid search, as a multiple of top_k
+HYBRID_CANDIDATES = 4
+# Rank offset of reciprocal rank fusion; damps the weight of top ranks
+RRF_K = 60
+# Turns kept per session in its own list, well above what memory compaction reads
+SESSION_TURNS_MAX = 200
+SESSION_TURNS_TTL = 7 * 24 * 3600
+# Analytics entries scanned for sessions that predate their turn list
+HISTORY_SCAN_WINDOW = 150
+
+
+def tenant_key_patterns(client_id: str) -> List[str]:
+    """Key patterns of a client's data, all stored on the client's shard"""
+    return [
+        f"client:{client_id}:*",
+        f"analytics:{client_id}",
+        f"summary:{client_id}",
+        f"chunk:{client_id}:*",
+        f"file:{client_id}:*",
+        f"files:{client_id}",
+        f"file_counter:{client_id}",
+        f"corpus:{client_id}",
+        f"semcache:{client_id}:*",
+        f"session_summary:{client_id}:*",
+        f"session_turns:{client_id}:*",
+        f"retrieval_cache_stats:{client_id}",
+    ]
+
+
+def reciprocal_rank_fusion(rankings: List[Any], top_k: int) -> List[Any]:
+    """Merge (docs, weight) rankings by weighted reciprocal rank"""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Any] = {}
+    for ranked_docs, weight in rankings:
+        for rank, doc in enumerate(ranked_docs, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + weight / (RRF_K + rank)
+            # Prefer the copy carrying a vector score over a full-text one
+            if not hasattr(docs.get(doc.id), "score"):
+                docs[doc.id] = doc
+
+    fused = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [docs[doc_id] for doc_id in fused]
+
+
+def _join_passages(previous: str, following: str, overlap: int = CHUNK_OVERLAP) -> str:
+    """Concatenate consecutive chunks, dropping the overlap chunking repeats.
+
+    Only a repeat of exactly the chunk overlap is dropped, so text that
+    genuinely recurs at a boundary (table rows, headings) is kept.
+    """
+    if overlap and previous.endswith(following[:overlap]):
+        return previous + following[overlap:]
+
+    # Chunks are cut at whitespace, which stripping removed
+    return f"{previous} {following}"
+
+
+def merge_adjacent_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge hits on consecutive chunks of a file into one passage, in rank order"""
+    groups: List[List[Dict[str, Any]]] = []
+    for hit in sorted(hits, key=lambda h: (h["file_id"], h["chunk_index"])):
+        last = groups[-1][-1] if groups else None
+        if (
+            last
+            and last["file_id"] == hit["file_id"]
+            and hit["chunk_index"] - last["chunk_index"] <= 1
+        ):
+            if hit["chunk_index"] != last["chunk_index"]:
+                groups[-1].append(hit)
+        else:
+            groups.append([hit])
+
+    rank = {id(hit): position for position, hit in enumerate(hits)}
+    merged = []
+    for group in groups:
+        content = group[0]["content"]
+        for hit in group[1:]:
+            content = _join_passages(content, hit["content"])
+        scores = [hit["score"] for hit in group if hit["score"] is not None]
+        merged.append(
+            (
+                min(rank[id(hit)] for hit in group),
+                {
+                    "content": content,
+                    "file_id": group[0]["file_id"],
+                    "filename": group[0]["filename"],
+                    "chunk_index": group[0]["chunk_index"],
+                    "chunk_indexes": [hit["chunk_index"] for hit in group],
+                    "score": max(scores) if scores else None,
+                },
+            )
+        )
+
+    merged.sort(key=lambda item: item[0])
+    return [hit for _, hit in merged]
+
 
 class RedisClient:
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:7379")
-        self.geminiClient = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        self.embedder = get_embedding_provider()
         self.clerk_secret_key = os.getenv("CLERK_SECRET_KEY")
         self.redis = None
+        self.redis_bytes = None
+        # Client data lives on shards; users, mappings and caches on the primary
+        self.router = ShardRouter()
+        self.shards: Dict[str, redis.Redis] = {}
+        self.shards_bytes: Dict[str, redis.Redis] = {}
+        # Read-only methods may use shard replicas within their lag tolerance
+        self.replica_router = ReplicaRouter()
         # self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
         self.vector_dim = 768
+        # Stored/indexed vector precision: FLOAT32, FLOAT16 or INT8
+        self.vector_type = os.getenv("VECTOR_TYPE", "FLOAT32").upper()
+        if self.vector_type not in VECTOR_FIELDS:
+            raise ValueError(f"Unsupported VECTOR_TYPE: {self.vector_type}")
+        # Index only a leading prefix of each (Matryoshka) embedding; 0 indexes all
+        self.index_dim = int(os.getenv("VECTOR_COARSE_DIM", "0")) or self.vector_dim
+        if not 0 < self.index_dim <= self.vector_dim:
+            raise ValueError(f"VECTOR_COARSE_DIM must be at most {self.vector_dim}")
+        self.vector_field = VECTOR_FIELDS[self.vector_type]
+        if self.index_dim < self.vector_dim:
+            self.vector_field = f"{self.vector_field}_{self.index_dim}"
+        # Keep full float32 vectors next to the indexed ones and re-rank with them
+        self.rerank_enabled = os.getenv("VECTOR_RERANK", "true").lower() == "true"
+        self.vector_rerank = self.vector_field != "embedding" and self.rerank_enabled
+        # Vector field each shard's chunk index serves, which lags vector_field
+        # until the index is rebuilt with the new settings
+        self.indexed_vectors: Dict[str, str] = {}
+        self.rerank_candidates = int(os.getenv("VECTOR_RERANK_CANDIDATES", "4"))
+        # HNSW build parameters for the chunk index
+        self.hnsw_params = {
+            "M": int(os.getenv("HNSW_M", "16")),
+            "EF_CONSTRUCTION": int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+            "EF_RUNTIME": int(os.getenv("HNSW_EF_RUNTIME", "10")),
+        }
+        # Query-time EF_RUNTIME grows with the time left to search, up to a cap
+        self.hnsw_ef_per_ms = float(os.getenv("HNSW_EF_PER_MS", "0.025"))
+        self.hnsw_ef_runtime_max = int(os.getenv("HNSW_EF_RUNTIME_MAX", "200"))
+        # Minimum cosine similarity of retrieved chunks, unless a client sets its own
+        self.retrieval_min_similarity = float(
+            os.getenv("RETRIEVAL_MIN_SIMILARITY", "0.0")
+        )
+        # Minimum cosine similarity for serving a cached answer to a new query
+        self.semantic_cache_threshold = float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")
+        )
+        # Chunk hashes per pipelined round trip when storing a file; with
+        # CHUNK_WRITE_ATOMIC the whole file goes in one MULTI/EXEC instead
+        self.chunk_write_batch_size = int(os.getenv("CHUNK_WRITE_BATCH_SIZE", "500"))
+        self.chunk_write_atomic = (
+            os.getenv("CHUNK_WRITE_ATOMIC", "false").lower() == "true"
+        )
 
         if not self.clerk_secret_key:
             raise ValueError("CLERK_SECRET_KEY environment variable is required")
 
         self.clerk = Clerk(bearer_auth=self.clerk_secret_key)
+        self.query_batcher = EmbeddingBatcher(self._embed_texts)
+        self.ingest_embedder = EmbeddingScheduler(self._embed_texts)
+        self.embedding_cache = EmbeddingCache(
+            self.embedder.embedding_model, self.vector_dim
+        )
+        self.retrieval_cache = RetrievalCache()
 
     async def connect(self):
         """Initialize Redis connection and create indexes"""
         try:
             # self.redis = redis.from_url(self.redis_url, decode_responses=True)
-            self.redis = redis.Redis(
-                host=os.getenv("REDIS_HOST", ""),
-                port=os.getenv("REDIS_PORT", ""),
-                decode_responses=True,
-                username=os.getenv("REDIS_USERNAME", ""),
-                password=os.getenv("REDIS_PASSWORD", ""),
-            )
+            connection_kwargs = {
+                "host": os.getenv("REDIS_HOST", ""),
+                "port": os.getenv("REDIS_PORT", ""),
+                "username": os.getenv("REDIS_USERNAME", ""),
+                "password": os.getenv("REDIS_PASSWORD", ""),
+            }
+            self.redis = redis.Redis(decode_responses=True, **connection_kwargs)
+            # Separate connection for binary values such as embeddings
+            self.redis_bytes = redis.Redis(decode_responses=False, **connection_kwargs)
 
             await self.redis.ping()
+
+            if self.router.sharded:
+                for name, url in self.router.shard_urls.items():
+                    self.shards[name] = redis.Redis.from_url(url, decode_responses=True)
+                    self.shards_bytes[name] = redis.Redis.from_url(
+                        url, decode_responses=False
+                    )
+                    await self.shards[name].ping()
+                await self.router.refresh(self.redis)
+                self.router.start(self.redis)
+            else:
+                self.shards = {DEFAULT_SHARD: self.redis}
+                self.shards_bytes = {DEFAULT_SHARD: self.redis_bytes}
+
+            await self.replica_router.connect(self.shards)
             await self.create_vector_index()
-            logger.info("Redis connected successfully")
+            await self.create_semantic_cache_index()
+            logger.info(f"Redis connected successfully ({len(self.shards)} shards)")
         except Exception as e:
             logger.error(f"Redis connection failed: {e}")
             raise RedisError(f"Failed to connect to Redis: {e}")
 
     async def close(self):
         """Properly close Redis connection"""
+        if self.shards:
+            await self.retrieval_cache.flush(self)
+            await self.replica_router.close()
+            await self.router.close()
+            if self.router.sharded:
+                for conn in [*self.shards.values(), *self.shards_bytes.values()]:
+                    await conn.close()
+            self.shards = {}
+            self.shards_bytes = {}
         if self.redis:
             # Close the main Redis connection
             await self.redis.close()
             self.redis = None
             logger.info("Redis connection close")
+        if self.redis_bytes:
+            await self.redis_bytes.close()
+            self.redis_bytes = None
+
+    def tenant(self, client_id: str, read: Optional[str] = None) -> redis.Redis:
+        """Connection to the shard holding a client's data.
+
+        Read-only callers pass their method name as `read` to be served by a
+        replica whose lag that method tolerates. Other callers may write, and
+        are refused while the client is being migrated to another shard.
+        """
+        shard = self.router.shard_for(client_id, self.redis)
+        if read:
+            replica = self.replica_router.pick(shard, client_id, read)
+            if replica is not None:
+                return self.replica_router.replicas[shard][replica]
+        else:
+            self._check_writable(client_id)
+        return self.shards[shard]
+
+    def tenant_bytes(self, client_id: str, read: Optional[str] = None) -> redis.Redis:
+        """Binary-safe connection to the shard holding a client's data"""
+        shard = self.router.shard_for(client_id, self.redis)
+        if read:
+            replica = self.replica_router.pick(shard, client_id, read)
+            if replica is not None:
+                return self.replica_router.replicas_bytes[shard][replica]
+        else:
+            self._check_writable(client_id)
+        return self.shards_bytes[shard]
+
+    def _check_writable(self, client_id: str):
+        if self.router.migrating(client_id):
+            raise RedisError(
+                f"Client {client_id} is being moved to another shard; retry shortly"
+            )
 
     # Messaging
 
@@ -95,10 +327,20 @@ class RedisClient:
                 "response_time": str(response_time),
                 "cached": "1" if cached else "0",
             }
-            await self.redis.xadd(analytics_key, message_data)
+            turns_key = f"session_turns:{client_id}:{session_id}"
+            turn = {
+                key: message_data[key] for key in ("timestamp", "message", "response")
+            }
 
+            pipe = self.tenant(client_id).pipeline(transaction=False)
+            pipe.xadd(analytics_key, message_data)
             # Keep last 10000 messages (adjust as needed)
-            await self.redis.xtrim(analytics_key, maxlen=10000)
+            pipe.xtrim(analytics_key, maxlen=10000)
+            # Per-session copy, so history reads don't scan other sessions' turns
+            pipe.rpush(turns_key, json.dumps(turn))
+            pipe.ltrim(turns_key, -SESSION_TURNS_MAX, -1)
+            pipe.expire(turns_key, SESSION_TURNS_TTL)
+            await pipe.execute()
 
             # Update client summary (lightweight counters)
             await self._update_client_summary(client_id, response_time, cached)
@@ -110,125 +352,461 @@ class RedisClient:
         """Track cache miss for analytics"""
         await self._increment_analytics(client_id, "cache_misses", 1)
 
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a chat query, using the embedding cache and batching misses"""
+        # query_embedding = self.model.encode(query).astype(np.float32)
+        query_embedding = await self.embedding_cache.get(self.redis_bytes, query)
+        if query_embedding is None:
+            query_embedding = await self.query_batcher.embed(query)
+            await self.embedding_cache.set(self.redis_bytes, query, query_embedding)
+        return query_embedding
+
+    async def _embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed a list of texts with the embedding provider in one call"""
+        return await self.embedder.embed(texts, self.vector_dim)
+
     async def semantic_search(
-        self, client_id: str, query: str, top_k: int = 3
-    ) -> List[str]:
-        """Perform semantic search on stored chunks"""
+        self,
+        client_id: str,
+        query: str,
+        top_k: int = 3,
+        query_embedding: Optional[np.ndarray] = None,
+        config: Optional[ClientConfig] = None,
+        ef_runtime: Optional[int] = None,
+        cache_lookup: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Perform semantic (or hybrid, per client config) search on stored chunks.
+
+        Returns hits with content, file_id, filename, chunk_index and cosine
+        similarity as score, best first. Hits below the client's similarity
+        threshold are dropped and consecutive chunks of a file are merged.
+        Hybrid hits found only by full-text search have no score and are kept.
+        Callers that already tried cached_search pass cache_lookup=False.
+        """
         try:
 
-            chunk_keys = await self.redis.keys(f"chunk:{client_id}:*")
-            logger.info(f"Found {len(chunk_keys)} chunk keys for client {client_id}")
+            corpus = await self.get_corpus(client_id, read="semantic_search")
 
-            if not chunk_keys:
+            if corpus["chunk_count"] <= 0:
                 logger.warning(f"No chunks found for client {client_id}")
                 return []
 
-            # Generate query embedding
-            # query_embedding = self.model.encode(query).astype(np.float32)
-
-            # Generate query embedding with Google Gemini
-            response = self.geminiClient.models.embed_content(
-                model="gemini-embedding-001",
-                contents=query,
-                config=types.EmbedContentConfig(output_dimensionality=self.vector_dim),
+            min_similarity = self._min_similarity(config)
+            hybrid = bool(config and config.retrieval_mode == "hybrid")
+            cache_key = self._retrieval_cache_key(
+                client_id, corpus["version"], query, top_k, config
             )
+            if cache_lookup:
+                cached = self.retrieval_cache.get(self, client_id, cache_key)
+                if cached is not None:
+                    return cached
 
-            query_embedding = np.array(response.embeddings[0].values, dtype=np.float32)
+            if query_embedding is None:
+                query_embedding = await self.embed_query(query)
 
-            # Use KNN search within the client's documents
-            vector_query = (
-                f"@client_id:{{{client_id}}}=>[KNN {top_k} @embedding $vec AS score]"
-            )
+            if hybrid:
+                docs = await self._hybrid_search(
+                    client_id, query, query_embedding, top_k, config, ef_runtime
+                )
+            elif local_search.eligible(corpus):
+                # Small corpora are cheaper to scan in process than to query
+                docs = await local_search.search(
+                    self, client_id, corpus["version"], query_embedding, top_k
+                )
+            else:
+                docs = await self._vector_search(
+                    client_id, query_embedding, top_k, ef_runtime
+                )
 
-            query_obj = (
-                Query(vector_query)
-                .return_fields("content", "score", "filename", "chunk_index", "file_id")
-                .sort_by("score")
-                .paging(0, top_k)
-                .dialect(2)
+            hits = []
+            for doc in docs:
+                score = getattr(doc, "score", None)
+                similarity = 1 - float(score) if score is not None else None
+                if similarity is not None and similarity < min_similarity:
+                    continue
+                hits.append(
+                    {
+                        "content": doc.content,
+                        "file_id": doc.file_id,
+                        "filename": doc.filename,
+                        "chunk_index": int(doc.chunk_index),
+                        "score": similarity,
+                    }
+                )
+
+            hits = merge_adjacent_hits(hits)
+            self.retrieval_cache.set(cache_key, hits)
+            return hits
+
+        except Exception as e:
+            logger.error(f"Semantic search failed: {e}")
+            return []
+
+    async def cached_search(
+        self,
+        client_id: str,
+        query: str,
+        top_k: int = 3,
+        config: Optional[ClientConfig] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Cached semantic_search hits for a query, found without embedding it"""
+        try:
+            corpus = await self.get_corpus(client_id, read="semantic_search")
+            if corpus["chunk_count"] <= 0:
+                return []
+            cache_key = self._retrieval_cache_key(
+                client_id, corpus["version"], query, top_k, config
             )
+            return self.retrieval_cache.get(self, client_id, cache_key)
+        except Exception as e:
+            logger.error(f"Retrieval cache lookup failed: {e}")
+            return None
+
+    def _min_similarity(self, config: Optional[ClientConfig]) -> float:
+        if config and config.min_similarity is not None:
+            return config.min_similarity
+        return self.retrieval_min_similarity
+
+    def _retrieval_cache_key(
+        self,
+        client_id: str,
+        version: int,
+        query: str,
+        top_k: int,
+        config: Optional[ClientConfig],
+    ) -> str:
+        """Retrieval cache key covering the options that shape the hits"""
+        hybrid = bool(config and config.retrieval_mode == "hybrid")
+        return self.retrieval_cache.key(
+            client_id,
+            version,
+            query,
+            top_k=top_k,
+            min_similarity=self._min_similarity(config),
+            hybrid_weights=(
+                [config.hybrid_text_weight, config.hybrid_vector_weight]
+                if hybrid
+                else None
+            ),
+        )
+
+    def _vector_spec(self, field: str) -> Tuple[str, int]:
+        return vector_field_spec(field, self.vector_dim) or (
+            self.vector_type,
+            self.index_dim,
+        )
+
+    def _indexed_vector(self, client_id: str) -> str:
+        """Vector field the chunk index of the client's shard serves"""
+        shard = self.router.shard_for(client_id, self.redis)
+        return self.indexed_vectors.get(shard, self.vector_field)
+
+    def _vector_query(
+        self,
+        client_id: str,
+        top_k: int,
+        ef_runtime: Optional[int] = None,
+        field: Optional[str] = None,
+    ) -> Query:
+        """KNN query within the client's documents"""
+        ef_clause = " EF_RUNTIME $ef" if ef_runtime else ""
+        vector_query = (
+            f"@client_id:{{{client_id}}}"
+            f"=>[KNN {top_k} @{field or self.vector_field} $vec{ef_clause} AS score]"
+        )
+
+        return (
+            Query(vector_query)
+            .return_fields("content", "score", "filename", "chunk_index", "file_id")
+            .sort_by("score")
+            .paging(0, top_k)
+            .dialect(2)
+        )
+
+    def _text_query(self, client_id: str, query: str, top_k: int) -> Optional[Query]:
+        """BM25 full-text query matching any term of the question"""
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return None
 
-            results = await self.redis.ft("chunks_idx").search(
-                query_obj, query_params={"vec": query_embedding.tobytes()}
+        text_query = f"@client_id:{{{client_id}}} @content:({'|'.join(terms)})"
+
+        return (
+            Query(text_query)
+            .scorer("BM25")
+            .return_fields("content", "filename", "chunk_index", "file_id")
+            .paging(0, top_k)
+            .dialect(2)
+        )
+
+    def _vector_params(
+        self,
+        query_embedding: np.ndarray,
+        ef_runtime: Optional[int] = None,
+        field: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        vector_type, dim = self._vector_spec(field or self.vector_field)
+        params = {"vec": encode_vector(query_embedding[:dim], vector_type)}
+        if ef_runtime:
+            params["ef"] = ef_runtime
+        return params
+
+    async def _vector_search(
+        self,
+        client_id: str,
+        query_embedding: np.ndarray,
+        top_k: int,
+        ef_runtime: Optional[int] = None,
+    ) -> List[Any]:
+        # Coarse or reduced-precision indexes fetch extra candidates for re-ranking
+        field = self._indexed_vector(client_id)
+        rerank = field != "embedding" and self.rerank_enabled
+        candidates = top_k * self.rerank_candidates if rerank else top_k
+
+        conn = self.tenant(client_id, "semantic_search")
+        results = await conn.ft(CHUNKS_INDEX).search(
+            self._vector_query(client_id, candidates, ef_runtime, field),
+            query_params=self._vector_params(query_embedding, ef_runtime, field),
+        )
+
+        if not rerank:
+            return results.docs
+        return await self._rerank(client_id, results.docs, query_embedding, top_k)
+
+    async def _rerank(
+        self, client_id: str, docs: List[Any], query_embedding: np.ndarray, top_k: int
+    ) -> List[Any]:
+        """Re-order candidates by cosine similarity of their full-precision vectors"""
+        if not docs:
+            return docs
+
+        conn = self.tenant_bytes(client_id, "semantic_search")
+        pipe = conn.pipeline(transaction=False)
+        for doc in docs:
+            pipe.hget(doc.id, "embedding")
+        raw_vectors = await pipe.execute()
+
+        query = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+        scored = []
+        for doc, raw in zip(docs, raw_vectors):
+            if raw and len(raw) == self.vector_dim * 4:
+                vector = decode_vector(raw)
+                similarity = float(vector @ query) / (np.linalg.norm(vector) or 1.0)
+            else:
+                # No full vector stored; fall back to the index's own distance
+                similarity = 1 - float(doc.score)
+            doc.score = str(1 - similarity)
+            scored.append((similarity, doc))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [doc for _, doc in scored[:top_k]]
+
+    async def _hybrid_search(
+        self,
+        client_id: str,
+        query: str,
+        query_embedding: np.ndarray,
+        top_k: int,
+        config: ClientConfig,
+        ef_runtime: Optional[int] = None,
+    ) -> List[Any]:
+        """Run full-text and KNN queries in one round trip and fuse their rankings"""
+        text_query = self._text_query(client_id, query, top_k * HYBRID_CANDIDATES)
+        if text_query is None:
+            return await self._vector_search(
+                client_id, query_embedding, top_k, ef_runtime
             )
 
-            # Extract content from results
-            content_results = []
-            for doc in results.docs:
-                content_results.append(doc.content)
+        field = self._indexed_vector(client_id)
+        vector_query = self._vector_query(
+            client_id, top_k * HYBRID_CANDIDATES, ef_runtime, field
+        )
+
+        conn = self.tenant(client_id, "semantic_search")
+        pipe = conn.ft(CHUNKS_INDEX).pipeline(transaction=False)
+        await pipe.search(text_query)
+        await pipe.search(
+            vector_query,
+            query_params=self._vector_params(query_embedding, ef_runtime, field),
+        )
+        text_raw, vector_raw = await pipe.execute()
+
+        text_docs = Result(
+            text_raw, True, field_encodings=text_query._return_fields_decode_as
+        ).docs
+        vector_docs = Result(
+            vector_raw, True, field_encodings=vector_query._return_fields_decode_as
+        ).docs
+        if field != "embedding" and self.rerank_enabled:
+            vector_docs = await self._rerank(
+                client_id, vector_docs, query_embedding, len(vector_docs)
+            )
 
-            return content_results
+        return reciprocal_rank_fusion(
+            [
+                (text_docs, config.hybrid_text_weight),
+                (vector_docs, config.hybrid_vector_weight),
+            ],
+            top_k,
+        )
 
-        except Exception as e:
-            logger.error(f"Semantic search failed: {e}")
-            return []
+    async def cache_response(
+        self,
+        key: str,
+        response: str,
+        ttl: int = 3600,
+        client_id: Optional[str] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        corpus_version: Optional[int] = None,
+    ):
+        """Cache AI response, and index it by query embedding when one is given.
 
-    async def cache_response(self, key: str, response: str, ttl: int = 3600):
-        """Cache AI response"""
+        Semantic entries are tagged with the corpus version they were answered
+        from, so they stop matching once the client's documents change. Without
+        an embedding the entry only serves get_exact_cached_response.
+        """
         try:
             await self.redis.setex(f"cache:{key}", ttl, response)
+
+            if client_id and corpus_version is not None:
+                semcache_key = f"semcache:{client_id}:{key}"
+                entry = {
+                    "client_id": client_id,
+                    "corpus_version": corpus_version,
+                    "response": response,
+                }
+                if query_embedding is not None:
+                    entry["embedding"] = query_embedding.astype(np.float32).tobytes()
+                pipe = self.tenant(client_id).pipeline()
+                pipe.hset(semcache_key, mapping=entry)
+                pipe.expire(semcache_key, ttl)
+                await pipe.execute()
         except Exception as e:
             logger.error(f"Failed to cache response: {e}")
 
-    async def get_chat_history(self, client_id: str, session_id: str, limit: int = 50):
-        """Get chat history for a session from analytics stream, limited to 40,000 characters"""
+    async def get_exact_cached_response(
+        self, client_id: str, key: str, corpus_version: int
+    ) -> Optional[str]:
+        """Get the cached AI response to the same normalized question, answered
+        from the given version of the client's corpus"""
         try:
-            analytics_key = f"analytics:{client_id}"
+            conn = self.tenant(client_id, "get_semantic_cached_response")
+            version, response = await conn.hmget(
+                f"semcache:{client_id}:{key}", ["corpus_version", "response"]
+            )
+            if response is None or version != str(corpus_version):
+                return None
+            logger.info(f"Exact cache hit for client {client_id}")
+            return response
+        except Exception as e:
+            logger.error(f"Failed to get exact cached response: {e}")
+            return None
 
-            # Get messages from analytics stream for this specific session
-            all_messages = await self.redis.xrevrange(
-                analytics_key, count=limit * 3
-            )  # Get more to filter
+    async def get_semantic_cached_response(
+        self,
+        client_id: str,
+        query_embedding: np.ndarray,
+        corpus_version: int,
+        threshold: Optional[float] = None,
+    ) -> Optional[str]:
+        """Get a cached AI response for the most similar previous query of this
+        client, answered from the given version of its corpus"""
+        try:
+            threshold = (
+                self.semantic_cache_threshold if threshold is None else threshold
+            )
 
-            if not all_messages:
-                logger.info(
-                    f"No chat history found for client {client_id}, session {session_id}"
+            query_obj = (
+                Query(
+                    f"@client_id:{{{client_id}}} @corpus_version:{{{corpus_version}}}"
+                    "=>[KNN 1 @embedding $vec AS score]"
                 )
-                return ""
-
-            # Filter messages for this specific session
-            session_messages = []
-            for msg_id, message_data in all_messages:
-                if message_data.get("session_id") == session_id:
-                    session_messages.append((msg_id, message_data))
-                    if len(session_messages) >= limit:
-                        break
+                .return_fields("response", "score")
+                .sort_by("score")
+                .paging(0, 1)
+                .dialect(2)
+            )
 
-            if not session_messages:
-                logger.info(f"No messages found for session {session_id}")
-                return ""
+            conn = self.tenant(client_id, "get_semantic_cached_response")
+            results = await conn.ft("semcache_idx").search(
+                query_obj,
+                query_params={"vec": query_embedding.astype(np.float32).tobytes()},
+            )
 
-            history_parts = []
-            total_chars = 0
-            char_limit = 40000
+            if not results.docs:
+                return None
 
-            # Process messages in chronological order (reverse the list since we got them in reverse)
-            for _, message_data in reversed(session_messages):
-                user_msg = message_data.get("message", "")
-                ai_msg = message_data.get("response", "")
-                timestamp = message_data.get("timestamp", "")
+            # COSINE distance is 1 - cosine similarity
+            doc = results.docs[0]
+            similarity = 1 - float(doc.score)
+            if similarity < threshold:
+                return None
 
-                # Format the entry with timestamp for better context
-                entry = f"[{timestamp}]\nUser: {user_msg}\nAI: {ai_msg}\n\n"
+            logger.info(
+                f"Semantic cache hit for client {client_id} (similarity {similarity:.3f})"
+            )
+            return doc.response
 
-                if total_chars + len(entry) > char_limit:
-                    logger.warning(
-                        f"Chat history for session {session_id} exceeds 40k character limit"
-                    )
-                    break
+        except Exception as e:
+            logger.error(f"Failed to get semantic cached response: {e}")
+            return None
 
-                history_parts.append(entry)
-                total_chars += len(entry)
+    async def get_chat_history(
+        self,
+        client_id: str,
+        session_id: str,
+        limit: int = 50,
+        read: Optional[str] = "get_chat_history",
+    ) -> List[Dict[str, str]]:
+        """Get the last `limit` chat turns of a session, oldest first.
+
+        Callers that must see a turn they just stored pass read=None to read
+        the primary instead of a replica.
+        """
+        try:
+            conn = self.tenant(client_id, read)
+            turns = [
+                json.loads(turn)
+                for turn in await conn.lrange(
+                    f"session_turns:{client_id}:{session_id}", -limit, -1
+                )
+            ]
+            if len(turns) >= limit:
+                return turns
 
-            history = "".join(history_parts)
-            logger.info(
-                f"Retrieved {len(session_messages)} messages ({total_chars} chars) for session {session_id}"
+            # Sessions from before per-session lists keep older turns only in
+            # the analytics stream; scan a fixed window of it for them
+            analytics_key = f"analytics:{client_id}"
+            all_messages = await conn.xrevrange(
+                analytics_key, count=max(HISTORY_SCAN_WINDOW, limit * 3)
             )
+
+            # Filter messages for this specific session
+            session_messages = []
+            for msg_id, message_data in all_messages:
+                if message_data.get("session_id") == session_id:
+                    session_messages.append(
+                        {
+                            "timestamp": message_data.get("timestamp", ""),
+                            "message": message_data.get("message", ""),
+                            "response": message_data.get("response", ""),
+                        }
+                    )
+
+            # Chronological order (reverse the list since we got them in reverse)
+            session_messages.reverse()
+            older = [
+                message
+                for message in session_messages
+                if not turns or message["timestamp"] < turns[0]["timestamp"]
+            ]
+            history = (older + turns)[-limit:]
+            logger.info(f"Retrieved {len(history)} messages for session {session_id}")
             return history
 
         except Exception as e:
             logger.error(f"Failed to get chat history: {e}")
-            return ""
+            return []
 
     # Client
 
@@ -236,7 +814,7 @@ class RedisClient:
         """Get client configuration"""
         try:
             key = f"client:{client_id}:config"
-            data = await self.redis.json().get(key)
+            data = await self.tenant(client_id, "get_client_config").json().get(key)
             if data:
                 return ClientConfig(**data)
             return None
@@ -257,9 +835,9 @@ class RedisClient:
         """Store client configuration"""
         try:
             key = f"client:{config.client_id}:config"
-            await self.redis.json().set(key, "$", config.model_dump())
+            await self.tenant(config.client_id).json().set(key, "$", config.model_dump())
             # Set expiration to 30 days
-            await self.redis.expire(key, 30 * 24 * 3600)
+            await self.tenant(config.client_id).expire(key, 30 * 24 * 3600)
         except Exception as e:
             raise RedisError(f"Failed to store client config: {e}")
 
@@ -271,45 +849,245 @@ class RedisClient:
         except Exception as e:
             logger.error(f"Failed to publish config update: {e}")
 
+    def _chunk_index_fields(self) -> List[Any]:
+        """Fields of the chunk vector index, with HNSW parameters from config"""
+        return [
+            TagField("client_id"),
+            TextField(
+                "content"
+            ),  # Changed from TagField to TextField for text search
+            TextField("filename"),  # Add filename as searchable text field
+            TextField("file_id"),  # Add file_id as text field
+            VectorField(
+                self.vector_field,
+                "HNSW",
+                {
+                    "TYPE": self.vector_type,
+                    "DIM": self.index_dim,
+                    "DISTANCE_METRIC": "COSINE",
+                    **self.hnsw_params,
+                },
+            ),
+        ]
+
+    async def _create_chunk_index(self, conn: redis.Redis, index_name: str):
+        definition = IndexDefinition(prefix=["chunk:"], index_type=IndexType.HASH)
+        await conn.ft(index_name).create_index(
+            fields=self._chunk_index_fields(), definition=definition
+        )
+
     async def create_vector_index(self):
-        """Create vector search index if it doesn't exist"""
-        try:
-            # Check if index exists
+        """Create vector search index on every shard if it doesn't exist"""
+        for shard, conn in self.shards.items():
             try:
-                await self.redis.ft("chunks_idx").info()
-                logger.info("Vector index already exists")
-                return  # Index already exists
-            except:
-                logger.info("Creating new vector index")
-
-            # FIXED: Create proper vector index with correct field types
-            fields = [
-                TagField("client_id"),
-                TextField(
-                    "content"
-                ),  # Changed from TagField to TextField for text search
-                TextField("filename"),  # Add filename as searchable text field
-                TextField("file_id"),  # Add file_id as text field
-                VectorField(
-                    "embedding",
-                    "HNSW",
-                    {
-                        "TYPE": "FLOAT32",
-                        "DIM": self.vector_dim,
-                        "DISTANCE_METRIC": "COSINE",
-                    },
-                ),
-            ]
+                # Check if index exists
+                try:
+                    info = await conn.ft(CHUNKS_INDEX).info()
+                except:
+                    info = None
+                    logger.info(f"Creating new vector index on shard {shard}")
+
+                if info is not None:
+                    logger.info(f"Vector index already exists on shard {shard}")
+                    self._record_indexed_vector(shard, info)
+                    continue
 
-            definition = IndexDefinition(prefix=["chunk:"], index_type=IndexType.HASH)
+                # Versioned index behind an alias, so it can be rebuilt and swapped
+                index_name = f"{CHUNKS_INDEX}_v1"
+                await self._create_chunk_index(conn, index_name)
+                await conn.ft(index_name).aliasadd(CHUNKS_INDEX)
+                await conn.set(f"index_version:{CHUNKS_INDEX}", 1)
+                self.indexed_vectors[shard] = self.vector_field
+                logger.info("Vector index created successfully")
+
+            except Exception as e:
+                logger.error(f"Failed to create vector index on shard {shard}: {e}")
+
+    def _record_indexed_vector(self, shard: str, info: Dict[str, Any]):
+        """Remember which vector field a shard's existing chunk index serves"""
+        for attribute in info.get("attributes", []):
+            spec = dict(zip(attribute[::2], attribute[1::2]))
+            if str(spec.get("type")) != "VECTOR":
+                continue
+            field = str(spec.get("attribute") or spec.get("identifier"))
+            if field != self.vector_field:
+                logger.warning(
+                    f"{CHUNKS_INDEX} on shard {shard} indexes {field}, not "
+                    f"{self.vector_field}; querying {field} until it is rebuilt"
+                )
+            self.indexed_vectors[shard] = field
+            return
 
-            await self.redis.ft("chunks_idx").create_index(
-                fields=fields, definition=definition
+    async def rebuild_vector_index(
+        self,
+        keep_old: bool = False,
+        poll_interval: float = 1.0,
+        on_progress: Optional[Callable[[str, float], None]] = None,
+    ) -> Dict[str, str]:
+        """Rebuild the chunk index on every shard; returns the new index per shard"""
+        new_indexes = {}
+        for shard, conn in self.shards.items():
+            progress = (lambda p, shard=shard: on_progress(shard, p)) if on_progress else None
+            new_indexes[shard] = await self._rebuild_shard_index(
+                conn, keep_old, poll_interval, progress
             )
-            logger.info("Vector index created successfully")
+            self.indexed_vectors[shard] = self.vector_field
+        return new_indexes
+
+    async def _rebuild_shard_index(
+        self,
+        conn: redis.Redis,
+        keep_old: bool = False,
+        poll_interval: float = 1.0,
+        on_progress: Optional[Callable[[float], None]] = None,
+    ) -> str:
+        """Build a new chunk index version in the background, then swap the alias to it"""
+        try:
+            current = await conn.ft(CHUNKS_INDEX).info()
+            old_index = current.get("index_name", CHUNKS_INDEX)
+            version = int(await conn.get(f"index_version:{CHUNKS_INDEX}") or 0)
+
+            new_index = f"{CHUNKS_INDEX}_v{version + 1}"
+            await self._create_chunk_index(conn, new_index)
+            logger.info(f"Building {new_index} with {self.hnsw_params}")
+
+            # Existing chunk hashes are indexed by Redis in the background
+            while True:
+                info = await conn.ft(new_index).info()
+                progress = float(info.get("percent_indexed", 1))
+                if on_progress:
+                    on_progress(progress)
+                if str(info.get("indexing", "0")) == "0" and progress >= 1:
+                    break
+                await asyncio.sleep(poll_interval)
+
+            if old_index == CHUNKS_INDEX:
+                # Legacy index registered under the alias name itself
+                pipe = conn.pipeline(transaction=True)
+                pipe.execute_command("FT.DROPINDEX", CHUNKS_INDEX)
+                pipe.execute_command("FT.ALIASADD", CHUNKS_INDEX, new_index)
+                await pipe.execute()
+            else:
+                await conn.ft(new_index).aliasupdate(CHUNKS_INDEX)
+                if not keep_old:
+                    # Drop only the index; the chunk hashes stay
+                    await conn.ft(old_index).dropindex(delete_documents=False)
+
+            await conn.set(f"index_version:{CHUNKS_INDEX}", version + 1)
+            logger.info(f"Swapped {CHUNKS_INDEX} from {old_index} to {new_index}")
+            return new_index
 
         except Exception as e:
-            logger.error(f"Failed to create vector index: {e}")
+            logger.error(f"Failed to rebuild vector index: {e}")
+            raise RedisError(f"Failed to rebuild vector index: {e}")
+
+    async def migrate_chunk_vectors(
+        self,
+        batch_size: int = 500,
+        drop_full: bool = False,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Add vectors in the configured precision to existing chunk hashes"""
+        migrated = 0
+        try:
+            for conn in self.shards_bytes.values():
+                cursor = 0
+                while True:
+                    cursor, keys = await conn.scan(
+                        cursor, match="chunk:*", count=batch_size
+                    )
+                    if keys:
+                        pipe = conn.pipeline(transaction=False)
+                        for key in keys:
+                            pipe.hmget(key, ["embedding", self.vector_field])
+                        rows = await pipe.execute()
+
+                        pipe = conn.pipeline(transaction=False)
+                        for key, (full, reduced) in zip(keys, rows):
+                            if not full or len(full) != self.vector_dim * 4:
+                                continue
+                            if reduced is None and self.vector_field != "embedding":
+                                pipe.hset(
+                                    key,
+                                    self.vector_field,
+                                    encode_vector(
+                                        decode_vector(full)[: self.index_dim],
+                                        self.vector_type,
+                                    ),
+                                )
+                                migrated += 1
+                            if drop_full and self.vector_field != "embedding":
+                                pipe.hdel(key, "embedding")
+                        await pipe.execute()
+
+                        if on_progress:
+                            on_progress(migrated)
+
+                    if cursor == 0:
+                        break
+
+            logger.info(f"Migrated {migrated} chunk vectors to {self.vector_type}")
+            return migrated
+
+        except Exception as e:
+            logger.error(f"Failed to migrate chunk vectors: {e}")
+            raise RedisError(f"Failed to migrate chunk vectors: {e}")
+
+    def ef_runtime_for_budget(self, budget: float, top_k: int) -> int:
+        """HNSW EF_RUNTIME affordable within a retrieval budget in seconds"""
+        ef_runtime = int(budget * 1000 * self.hnsw_ef_per_ms)
+        return max(top_k, min(ef_runtime, self.hnsw_ef_runtime_max))
+
+    async def create_semantic_cache_index(self):
+        """Create the semantic response cache index on every shard if it doesn't exist"""
+        for shard, conn in self.shards.items():
+            try:
+                try:
+                    info = await conn.ft("semcache_idx").info()
+                except:
+                    info = None
+                    logger.info(f"Creating new semantic cache index on shard {shard}")
+
+                if info is not None:
+                    logger.info(f"Semantic cache index already exists on shard {shard}")
+                    if not any(
+                        "corpus_version" in map(str, attribute)
+                        for attribute in info.get("attributes", [])
+                    ):
+                        # Entries from before versioning never match and age out
+                        await conn.ft("semcache_idx").alter_schema_add(
+                            [TagField("corpus_version")]
+                        )
+                        logger.info(f"Added corpus_version to semcache_idx on {shard}")
+                    continue
+
+                fields = [
+                    TagField("client_id"),
+                    TagField("corpus_version"),
+                    VectorField(
+                        "embedding",
+                        "HNSW",
+                        {
+                            "TYPE": "FLOAT32",
+                            "DIM": self.vector_dim,
+                            "DISTANCE_METRIC": "COSINE",
+                        },
+                    ),
+                ]
+
+                definition = IndexDefinition(
+                    prefix=["semcache:"], index_type=IndexType.HASH
+                )
+
+                await conn.ft("semcache_idx").create_index(
+                    fields=fields, definition=definition
+                )
+                logger.info("Semantic cache index created successfully")
+
+            except Exception as e:
+                logger.error(
+                    f"Failed to create semantic cache index on shard {shard}: {e}"
+                )
 
     # User
 
@@ -336,6 +1114,10 @@ class RedisClient:
             # Create reverse mapping client_id -> user_id
             await self.redis.set(f"client_mapping:{client_id}", user_data["user_id"])
 
+            # Pin the client to its shard so adding shards later doesn't move it
+            if self.router.sharded:
+                await self.router.pin(self.redis, client_id)
+
             # Create default client config
             default_config = {
                 "client_id": client_id,
@@ -351,7 +1133,7 @@ class RedisClient:
             }
 
             config_key = f"client:{client_id}:config"
-            await self.redis.json().set(config_key, "$", default_config)
+            await self.tenant(client_id).json().set(config_key, "$", default_config)
 
             # Initialize analytics
             # await self._initialize_analytics(client_id)
@@ -396,35 +1178,33 @@ class RedisClient:
             keys_to_delete = [
                 user_key,  # Main user data
             ]
+            tenant_keys = []
 
             # Add client mapping if client_id exists
             if client_id:
-                keys_to_delete.extend(
-                    [
-                        f"client_mapping:{client_id}",  # Reverse mapping
-                        f"client:{client_id}:config",  # Client config
-                    ]
-                )
+                keys_to_delete.append(f"client_mapping:{client_id}")  # Reverse mapping
+                keys_to_delete.extend(await self.redis.keys(f"cache:*{client_id}*"))
 
-                # Delete analytics data
-                analytics_patterns = [
-                    f"analytics:{client_id}",
-                    f"client:{client_id}:sessions:*",
-                    f"chunk:{client_id}:*",
-                    f"cache:*{client_id}*",
-                    f"file_counter:{client_id}",
-                    f"files:{client_id}",
-                    f"summary:{client_id}",
-                    f"file:*{client_id}:*",
-                ]
+                # Client config, documents and analytics on the client's shard
+                tenant = self.tenant(client_id)
+                for pattern in tenant_key_patterns(client_id):
+                    matching_keys = await tenant.keys(pattern)
+                    tenant_keys.extend(matching_keys)
 
-                # Find and add keys matching patterns
-                for pattern in analytics_patterns:
-                    matching_keys = await self.redis.keys(pattern)
-                    keys_to_delete.extend(matching_keys)
+                local_search.invalidate(client_id)
 
             # Remove duplicates and filter out empty keys
             keys_to_delete = list(set(filter(None, keys_to_delete)))
+            tenant_keys = list(set(filter(None, tenant_keys)))
+
+            if tenant_keys:
+                pipe = tenant.pipeline()
+                for key in tenant_keys:
+                    pipe.delete(key)
+                await pipe.execute()
+
+            if client_id and self.router.sharded:
+                await self.router.unpin(self.redis, client_id)
 
             if keys_to_delete:
                 # Delete all keys in a pipeline for efficiency
@@ -434,7 +1214,7 @@ class RedisClient:
                 await pipe.execute()
 
                 logger.info(
-                    f"Deleted user {user_id} with client_id {client_id} and {len(keys_to_delete)} associated keys"
+                    f"Deleted user {user_id} with client_id {client_id} and {len(keys_to_delete) + len(tenant_keys)} associated keys"
                 )
             else:
                 logger.info(f"No keys found to delete for user {user_id}")
@@ -485,9 +1265,38 @@ class RedisClient:
     async def store_chunks(
         self, client_id: str, chunks: List[str], filemeta: Dict[str, Any]
     ):
-        """Store chunks and update file analytics"""
+        """Store chunks and update file analytics.
+
+        Embeddings arrive in batches from the ingestion scheduler and their
+        chunk hashes are written in pipelined batches as they come in; the file
+        record, file set, corpus counters and summary go with the last one, so
+        a file is only listed once all its chunks are stored.
+        """
+        conn = self.tenant(client_id)
+        file_id = None
         try:
-            file_id = await self.redis.incr(f"file_counter:{client_id}")
+            file_id = await conn.incr(f"file_counter:{client_id}")
+            await self.get_corpus(client_id)  # Backfill before adjusting counters
+
+            pipe = conn.pipeline(transaction=self.chunk_write_atomic)
+            async for offset, embeddings in self.ingest_embedder.stream(chunks):
+                for idx, embedding_array in enumerate(embeddings, start=offset):
+                    chunk_key = f"chunk:{client_id}:{file_id}:{idx}"
+                    chunk_data = {
+                        "client_id": client_id,
+                        "file_id": str(file_id),
+                        "content": chunks[idx],
+                        "chunk_index": str(idx),
+                        "total_chunks": str(len(chunks)),
+                        "filename": filemeta.get("filename", "unknown"),
+                    }
+                    chunk_data.update(self._vector_fields(embedding_array))
+                    pipe.hset(chunk_key, mapping=chunk_data)
+                    if (
+                        not self.chunk_write_atomic
+                        and len(pipe) >= self.chunk_write_batch_size
+                    ):
+                        await pipe.execute()
 
             # Store file metadata
             file_key = f"file:{client_id}:{file_id}"
@@ -498,38 +1307,15 @@ class RedisClient:
                 "uploaded_at": datetime.now().isoformat(),
                 "chunk_count": len(chunks),
             }
-            await self.redis.hset(file_key, mapping=file_data)
-
-            # Generate embeddings and store chunks
-            # embeddings = self.model.encode(chunks)
-            response = self.geminiClient.models.embed_content(
-                model="gemini-embedding-001",
-                contents=chunks,
-                config=types.EmbedContentConfig(output_dimensionality=self.vector_dim),
-            )
-
-            embeddings = response.embeddings
-
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                chunk_key = f"chunk:{client_id}:{file_id}:{idx}"
-                embedding_array = np.array(embedding.values, dtype=np.float32)
-                chunk_data = {
-                    "client_id": client_id,
-                    "file_id": str(file_id),
-                    "content": chunk,
-                    "embedding": embedding_array.tobytes(),
-                    "chunk_index": str(idx),
-                    "total_chunks": str(len(chunks)),
-                    "filename": filemeta.get("filename", "unknown"),
-                }
-                await self.redis.hset(chunk_key, mapping=chunk_data)
-
-            await self.redis.sadd(f"files:{client_id}", file_id)
-
+            pipe.hset(file_key, mapping=file_data)
+            pipe.sadd(f"files:{client_id}", file_id)
+            self._queue_corpus_update(pipe, client_id, len(chunks), 1)
             # Update summary with file info
-            await self._update_files_summary(
-                client_id, len(chunks), filemeta.get("size", 0)
+            self._queue_files_summary(
+                pipe, client_id, len(chunks), filemeta.get("size", 0)
             )
+            await pipe.execute()
+            local_search.invalidate(client_id)
 
             logger.info(
                 f"Stored {len(chunks)} chunks for client {client_id}, file {file_id}"
@@ -538,47 +1324,275 @@ class RedisClient:
 
         except Exception as e:
             logger.error(f"Failed to store chunks: {e}")
+            if file_id is not None:
+                # Chunks of a file that failed midway must not stay searchable
+                await self._discard_chunks(conn, client_id, file_id, len(chunks))
             raise RedisError(f"Failed to store chunks: {e}")
 
+    async def _discard_chunks(
+        self, conn: redis.Redis, client_id: str, file_id: int, chunk_count: int
+    ):
+        try:
+            keys = [f"chunk:{client_id}:{file_id}:{idx}" for idx in range(chunk_count)]
+            for i in range(0, len(keys), self.chunk_write_batch_size):
+                await conn.delete(*keys[i : i + self.chunk_write_batch_size])
+        except Exception as e:
+            logger.error(f"Failed to discard chunks of file {file_id}: {e}")
+
+    def _vector_fields(self, embedding: np.ndarray) -> Dict[str, bytes]:
+        """Hash fields for a chunk vector in the configured precision and dimension"""
+        fields = {}
+        # Also fill the fields indexes not yet rebuilt still query
+        for field in {self.vector_field, *self.indexed_vectors.values()}:
+            vector_type, dim = self._vector_spec(field)
+            fields[field] = encode_vector(embedding[:dim], vector_type)
+        if self.vector_rerank:
+            fields["embedding"] = encode_vector(embedding)
+        return fields
+
     async def delete_file_chunks(self, client_id: str, filename: str) -> bool:
         """Delete all chunks for a specific file"""
         try:
-            # Get all chunk keys for this client
-            chunk_keys = await self.redis.keys(f"chunk:{client_id}:*")
+            # Find the client's files with this filename
+            file_ids = list(await self.tenant(client_id).smembers(f"files:{client_id}"))
+            pipe = self.tenant(client_id).pipeline()
+            for file_id in file_ids:
+                pipe.hgetall(f"file:{client_id}:{file_id}")
+            files_data = await pipe.execute()
+
+            matching = [
+                (file_id, file_data)
+                for file_id, file_data in zip(file_ids, files_data)
+                if file_data.get("filename") == filename
+            ]
+            if not matching:
+                return False
 
             deleted_count = 0
-            for chunk_key in chunk_keys:
-                chunk_data = await self.redis.hgetall(chunk_key)
-                if "filemeta" in chunk_data:
-                    try:
-                        filemeta = json.loads(chunk_data["filemeta"])
-                        if filemeta.get("filename") == filename:
-                            await self.redis.delete(chunk_key)
-                            deleted_count += 1
-                    except (json.JSONDecodeError, KeyError):
-                        continue
-
-            if deleted_count > 0:
-                # Update analytics
-                await self._increment_analytics(client_id, "files_uploaded", -1)
-                await self._increment_analytics(
-                    client_id, "chunks_stored", -deleted_count
-                )
-                logger.info(f"Deleted {deleted_count} chunks for file {filename}")
+            deleted_size = 0
+            pipe = self.tenant(client_id).pipeline()
+            for file_id, file_data in matching:
+                chunk_count = int(file_data.get("chunk_count", 0))
+                for idx in range(chunk_count):
+                    pipe.delete(f"chunk:{client_id}:{file_id}:{idx}")
+                pipe.delete(f"file:{client_id}:{file_id}")
+                pipe.srem(f"files:{client_id}", file_id)
+                deleted_count += chunk_count
+                deleted_size += int(file_data.get("size", 0))
+            await pipe.execute()
+
+            # Update registry and analytics
+            await self._update_corpus(client_id, -deleted_count, -len(matching))
+            await self._update_files_summary(
+                client_id, -deleted_count, -deleted_size, files_added=-len(matching)
+            )
+            logger.info(f"Deleted {deleted_count} chunks for file {filename}")
 
-            return deleted_count > 0
+            return True
 
         except Exception as e:
             logger.error(f"Failed to delete file chunks: {e}")
             return False
 
+    # Sharding
+
+    async def pin_tenants(self, shard: str) -> int:
+        """Route every client without a routing entry to a shard, e.g. before adding shards"""
+        if not self.router.sharded:
+            raise ValueError("REDIS_SHARDS is not configured")
+        if shard not in self.shards:
+            raise ValueError(f"Unknown shard: {shard}")
+
+        pinned = 0
+        try:
+            async for key in self.redis.scan_iter(match="client_mapping:*", count=500):
+                client_id = key.split(":", 1)[1]
+                if await self.redis.hsetnx(TENANT_SHARDS_KEY, client_id, shard):
+                    pinned += 1
+            await self.router.refresh(self.redis)
+            return pinned
+        except Exception as e:
+            logger.error(f"Failed to pin tenants: {e}")
+            raise RedisError(f"Failed to pin tenants: {e}")
+
+    async def migrate_tenant(
+        self,
+        client_id: str,
+        target: str,
+        batch_size: int = 500,
+        delete_source: bool = False,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Copy a client's keys to another shard with DUMP/RESTORE, then route it there.
+
+        Writes for the client are refused from the time every worker has seen
+        its migration entry until the route is switched, so no update can land
+        on the source after its keys are copied. The source keys are kept
+        unless delete_source is set.
+        """
+        if target not in self.shards:
+            raise ValueError(f"Unknown shard: {target}")
+
+        await self.router.refresh(self.redis)
+        source_name = self.router.shard_for(client_id)
+        if source_name == target:
+            return 0
+        source = self.shards_bytes[source_name]
+        dest = self.shards_bytes[target]
+
+        try:
+            await self.router.begin_migration(self.redis, client_id, target)
+            # Workers stop writing once they reload routes, within routes_ttl
+            await asyncio.sleep(self.router.routes_ttl + 1)
+
+            keys = await self._scan_tenant_keys(source, client_id, batch_size)
+            copied = await self._copy_keys(
+                source, dest, keys, batch_size, True, on_progress
+            )
+
+            await self.router.finish_migration(self.redis, client_id, target)
+            local_search.invalidate(client_id)
+            logger.info(f"Migrated {copied} keys of client {client_id} to {target}")
+
+        except Exception as e:
+            try:
+                await self.router.abort_migration(self.redis, client_id)
+            except Exception as abort_error:
+                logger.error(f"Failed to unblock client {client_id}: {abort_error}")
+            logger.error(f"Failed to migrate client {client_id}: {e}")
+            raise RedisError(f"Failed to migrate client: {e}")
+
+        if delete_source:
+            # Workers with the old route may still read the source until reload
+            await asyncio.sleep(self.router.routes_ttl + 1)
+            try:
+                for i in range(0, len(keys), batch_size):
+                    await source.delete(*keys[i : i + batch_size])
+            except Exception as e:
+                logger.error(f"Failed to delete source keys of {client_id}: {e}")
+                raise RedisError(f"Failed to delete source keys: {e}")
+        return copied
+
+    async def _scan_tenant_keys(
+        self, conn: redis.Redis, client_id: str, batch_size: int
+    ) -> List[bytes]:
+        """All keys of a client on one shard"""
+        patterns = tenant_key_patterns(client_id)
+        keys = []
+        async for key in conn.scan_iter(match=f"*{client_id}*", count=batch_size):
+            name = key.decode()
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+                keys.append(key)
+        return keys
+
+    async def _copy_keys(
+        self,
+        source: redis.Redis,
+        dest: redis.Redis,
+        keys: List[bytes],
+        batch_size: int,
+        replace: bool,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Pipelined DUMP/RESTORE of keys with their remaining TTL"""
+        copied = 0
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i : i + batch_size]
+            pipe = source.pipeline(transaction=False)
+            for key in batch:
+                pipe.dump(key)
+                pipe.pttl(key)
+            dumped = await pipe.execute()
+
+            pipe = dest.pipeline(transaction=False)
+            for key, value, ttl in zip(batch, dumped[::2], dumped[1::2]):
+                if value is None:
+                    continue  # Deleted since the scan
+                pipe.restore(key, max(ttl, 0), value, replace=replace)
+            results = await pipe.execute(raise_on_error=False)
+
+            for result in results:
+                if not isinstance(result, Exception):
+                    copied += 1
+                elif replace or "BUSYKEY" not in str(result):
+                    raise result
+            if on_progress:
+                on_progress(copied)
+
+        return copied
+
+    # Corpus registry
+
+    async def get_corpus(
+        self, client_id: str, read: Optional[str] = None
+    ) -> Dict[str, int]:
+        """Get chunk count, file count and index version of a client's documents"""
+        data = await self.tenant(client_id, read).hgetall(f"corpus:{client_id}")
+        if not data:
+            return await self._rebuild_corpus(client_id)
+
+        return {
+            "chunk_count": int(data.get("chunk_count", 0)),
+            "file_count": int(data.get("file_count", 0)),
+            "version": int(data.get("version", 0)),
+        }
+
+    async def _update_corpus(self, client_id: str, chunks_added: int, files_added: int):
+        """Adjust corpus counters and bump its version after documents change"""
+        await self.get_corpus(client_id)  # Backfill clients that predate the registry
+
+        pipe = self.tenant(client_id).pipeline()
+        self._queue_corpus_update(pipe, client_id, chunks_added, files_added)
+        await pipe.execute()
+        local_search.invalidate(client_id)
+
+    def _queue_corpus_update(
+        self, pipe, client_id: str, chunks_added: int, files_added: int
+    ):
+        """Add corpus counter updates and a version bump to a pipeline"""
+        corpus_key = f"corpus:{client_id}"
+        pipe.hincrby(corpus_key, "chunk_count", chunks_added)
+        pipe.hincrby(corpus_key, "file_count", files_added)
+        pipe.hincrby(corpus_key, "version", 1)
+
+    async def _rebuild_corpus(self, client_id: str) -> Dict[str, int]:
+        """Recount a client's corpus from its file records.
+
+        Runs on the read path, so during a migration the counts are returned
+        without being saved, leaving the source keys untouched.
+        """
+        # The primary, as a lagging replica could miss recent files
+        conn = self.shards[self.router.shard_for(client_id, self.redis)]
+        file_ids = list(await conn.smembers(f"files:{client_id}"))
+        pipe = conn.pipeline()
+        for file_id in file_ids:
+            pipe.hget(f"file:{client_id}:{file_id}", "chunk_count")
+        chunk_counts = await pipe.execute() if file_ids else []
+
+        corpus = {
+            "chunk_count": sum(int(count or 0) for count in chunk_counts),
+            "file_count": len(file_ids),
+            "version": 1,
+        }
+        if self.router.migrating(client_id):
+            return corpus
+
+        # Only create the record if it is still missing
+        pipe = self.tenant(client_id).pipeline()
+        for field, value in corpus.items():
+            pipe.hsetnx(f"corpus:{client_id}", field, value)
+        await pipe.execute()
+        return corpus
+
     # Analytics
 
     async def get_analytics(self, client_id: str) -> Dict[str, Any]:
         """Get comprehensive analytics from unified documents"""
         try:
+            conn = self.tenant(client_id, "get_analytics")
+
             # Get summary data
-            summary = await self.redis.json().get(f"summary:{client_id}") or {
+            summary = await conn.json().get(f"summary:{client_id}") or {
                 "total_messages": 0,
                 "total_response_time": 0.0,
                 "cache_hits": 0,
@@ -589,7 +1603,7 @@ class RedisClient:
             analytics_key = f"analytics:{client_id}"
 
             # Get all messages (or last 1000 for performance)
-            all_messages = await self.redis.xrevrange(analytics_key, count=1000)
+            all_messages = await conn.xrevrange(analytics_key, count=1000)
 
             # Get file list
             files_list = await self.get_client_files(client_id)
@@ -725,6 +1739,9 @@ class RedisClient:
                 "total_interactions": unique_sessions,
                 "knowledge_base_size": summary["files_info"]["total_size"],
                 "cache_efficiency": round(cache_efficiency, 1),
+                "retrieval_cache": await self.retrieval_cache.client_stats(
+                    conn, client_id
+                ),
                 "avg_messages_per_session": round(avg_messages_per_session, 1),
                 "avg_response_time_per_session": round(avg_response_time, 2),
                 # File metrics
@@ -748,12 +1765,13 @@ class RedisClient:
 
     async def get_client_files(self, client_id: str) -> List[Dict[str, Any]]:
         try:
-            file_ids = await self.redis.smembers(f"files:{client_id}")
+            conn = self.tenant(client_id, "get_client_files")
+            file_ids = await conn.smembers(f"files:{client_id}")
             files = []
 
             for file_id in file_ids:
                 file_key = f"file:{client_id}:{file_id}"
-                file_data = await self.redis.hgetall(file_key)
+                file_data = await conn.hgetall(file_key)
                 if file_data:
                     files.append(
                         {
@@ -773,28 +1791,46 @@ class RedisClient:
             return []
 
     async def _update_files_summary(
-        self, client_id: str, chunks_added: int, file_size: int
+        self, client_id: str, chunks_added: int, file_size: int, files_added: int = 1
     ):
         """Update file summary in client summary"""
         try:
-            summary_key = f"summary:{client_id}"
-            current = await self.redis.json().get(summary_key) or {
+            pipe = self.tenant(client_id).pipeline()
+            self._queue_files_summary(
+                pipe, client_id, chunks_added, file_size, files_added
+            )
+            await pipe.execute()
+
+        except Exception as e:
+            logger.error(f"Failed to update files summary: {e}")
+
+    def _queue_files_summary(
+        self,
+        pipe,
+        client_id: str,
+        chunks_added: int,
+        file_size: int,
+        files_added: int = 1,
+    ):
+        """Add file summary increments to a pipeline, creating the summary if missing"""
+        summary_key = f"summary:{client_id}"
+        now = datetime.now().isoformat()
+        pipe.json().set(
+            summary_key,
+            "$",
+            {
                 "total_messages": 0,
                 "total_response_time": 0.0,
                 "cache_hits": 0,
-                "last_updated": datetime.now().isoformat(),
+                "last_updated": now,
                 "files_info": {"total_files": 0, "total_size": 0, "total_chunks": 0},
-            }
-
-            current["files_info"]["total_files"] += 1
-            current["files_info"]["total_size"] += file_size
-            current["files_info"]["total_chunks"] += chunks_added
-            current["last_updated"] = datetime.now().isoformat()
-
-            await self.redis.json().set(summary_key, "$", current)
-
-        except Exception as e:
-            logger.error(f"Failed to update files summary: {e}")
+            },
+            nx=True,
+        )
+        pipe.json().numincrby(summary_key, "$.files_info.total_files", files_added)
+        pipe.json().numincrby(summary_key, "$.files_info.total_size", file_size)
+        pipe.json().numincrby(summary_key, "$.files_info.total_chunks", chunks_added)
+        pipe.json().set(summary_key, "$.last_updated", now)
 
     async def _update_client_summary(
         self, client_id: str, response_time: float, cached: bool = False
@@ -804,7 +1840,7 @@ class RedisClient:
             summary_key = f"summary:{client_id}"
 
             # Get current summary
-            current = await self.redis.json().get(summary_key) or {
+            current = await self.tenant(client_id).json().get(summary_key) or {
                 "total_messages": 0,
                 "total_response_time": 0.0,
                 "cache_hits": 0,
@@ -819,7 +1855,7 @@ class RedisClient:
                 current["cache_hits"] += 1
             current["last_updated"] = datetime.now().isoformat()
 
-            await self.redis.json().set(summary_key, "$", current)
+            await self.tenant(client_id).json().set(summary_key, "$", current)
 
         except Exception as e:
             logger.error(f"Failed to update client summary: {e}")
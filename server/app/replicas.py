@@ -0,0 +1,140 @@
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+import zlib
+import logging
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Replica lag in seconds each read-only method tolerates; others read the primary
+DEFAULT_MAX_LAG = {
+    "semantic_search": 5.0,
+    "get_semantic_cached_response": 5.0,
+    "get_client_config": 5.0,
+    "get_client_files": 5.0,
+    "get_chat_history": 1.0,
+    "get_analytics": 30.0,
+}
+
+
+def parse_replicas(value: str) -> Dict[str, List[str]]:
+    """Parse REDIS_REPLICAS ("shard=redis://host:port,...") into shard -> URLs"""
+    replicas: Dict[str, List[str]] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        shard, sep, url = entry.partition("=")
+        if not sep or not shard.strip() or not url.strip():
+            raise ValueError(f"Invalid REDIS_REPLICAS entry: {entry}")
+        replicas.setdefault(shard.strip(), []).append(url.strip())
+    return replicas
+
+
+class ReplicaRouter:
+    """Send read-only calls to a shard's replicas while their lag is tolerable.
+
+    Lag is measured with a heartbeat: each worker writes the time to its own
+    key on every shard primary and reads it back from the replicas one check
+    interval later. A replica showing the latest heartbeat counts as caught up,
+    so lag is only resolved to REDIS_REPLICA_CHECK_INTERVAL.
+    """
+
+    def __init__(self):
+        self.replica_urls = parse_replicas(os.getenv("REDIS_REPLICAS", ""))
+        self.check_interval = float(os.getenv("REDIS_REPLICA_CHECK_INTERVAL", "1.0"))
+        self.max_lag = {
+            **DEFAULT_MAX_LAG,
+            **json.loads(os.getenv("REDIS_REPLICA_MAX_LAG", "{}")),
+        }
+        self.heartbeat_key = f"replica_heartbeat:{uuid.uuid4().hex}"
+        self._heartbeats: Dict[str, str] = {}
+        self.replicas: Dict[str, List[redis.Redis]] = {}
+        self.replicas_bytes: Dict[str, List[redis.Redis]] = {}
+        # Last measured lag per replica; infinite until the first check passes
+        self.lag: Dict[str, List[float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self, shards: Dict[str, redis.Redis]):
+        """Open replica connections and start measuring their lag"""
+        for shard, urls in self.replica_urls.items():
+            if shard not in shards:
+                raise ValueError(f"REDIS_REPLICAS refers to unknown shard {shard}")
+            self.replicas[shard] = [
+                redis.Redis.from_url(url, decode_responses=True) for url in urls
+            ]
+            self.replicas_bytes[shard] = [
+                redis.Redis.from_url(url, decode_responses=False) for url in urls
+            ]
+            self.lag[shard] = [math.inf] * len(urls)
+
+        if self.replicas:
+            await self.check(shards)  # First heartbeat; replicas join after one interval
+            self._task = asyncio.create_task(self._monitor(shards))
+
+    def pick(self, shard: str, client_id: str, method: str) -> Optional[int]:
+        """Index of a replica fresh enough for the method, or None for the primary"""
+        max_lag = self.max_lag.get(method)
+        lags = self.lag.get(shard)
+        if max_lag is None or not lags:
+            return None
+
+        fresh = [i for i, lag in enumerate(lags) if lag <= max_lag]
+        if not fresh:
+            return None
+        # Stable per client, so one request's reads see the same replica
+        return fresh[zlib.crc32(client_id.encode()) % len(fresh)]
+
+    async def check(self, shards: Dict[str, redis.Redis]):
+        """Measure replica lag against the last heartbeat, then write a new one"""
+        for shard, replicas in self.replicas.items():
+            last = self._heartbeats.get(shard)
+            for i, replica in enumerate(replicas):
+                try:
+                    value = await replica.get(self.heartbeat_key)
+                except Exception as e:
+                    logger.warning(f"Replica {i} of shard {shard} unavailable: {e}")
+                    self.lag[shard][i] = math.inf
+                    continue
+
+                if last is None:
+                    continue  # Nothing written yet to compare against
+                if value == last:
+                    self.lag[shard][i] = 0.0
+                else:
+                    self.lag[shard][i] = (
+                        time.time() - float(value) if value else math.inf
+                    )
+
+            try:
+                heartbeat = repr(time.time())
+                await shards[shard].set(self.heartbeat_key, heartbeat, ex=60)
+                self._heartbeats[shard] = heartbeat
+            except Exception as e:
+                logger.error(f"Failed to write replica heartbeat on {shard}: {e}")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for conn in [
+            *(c for conns in self.replicas.values() for c in conns),
+            *(c for conns in self.replicas_bytes.values() for c in conns),
+        ]:
+            await conn.close()
+        self.replicas = {}
+        self.replicas_bytes = {}
+        self.lag = {}
+
+    async def _monitor(self, shards: Dict[str, redis.Redis]):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check(shards)
+            except Exception as e:
+                logger.error(f"Replica lag check failed: {e}")
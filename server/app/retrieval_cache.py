@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class RetrievalCache:
+    """In-process LRU of semantic_search results, keyed on the corpus version.
+
+    Storing or deleting documents bumps the client's corpus version, so entries
+    for older versions are never read again and simply age out of the LRU.
+    """
+
+    def __init__(self):
+        self.max_entries = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+        # Upper bound on entry age, for changes that don't bump the version
+        self.ttl = int(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+        # Seconds between writes of per-client hit counters to Redis
+        self.flush_interval = float(os.getenv("RETRIEVAL_CACHE_FLUSH_INTERVAL", "10"))
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+        self._pending: Dict[str, List[int]] = {}
+        self._last_flush = time.monotonic()
+        self._tasks = set()
+
+    def key(self, client_id: str, version: int, query: str, **options: Any) -> str:
+        """Cache key for a query against one version of a client's corpus"""
+        normalized = " ".join(query.lower().split())
+        payload = json.dumps([normalized, options], sort_keys=True, default=str)
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        return f"{client_id}:{version}:{digest}"
+
+    def get(self, redis, client_id: str, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached hits for a key, counting the lookup for the client"""
+        hits = None
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, cached = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                hits = list(cached)
+            else:
+                del self._entries[key]
+
+        self._record(redis, client_id, hits is not None)
+        return hits
+
+    def set(self, key: str, hits: List[Dict[str, Any]]):
+        self._entries[key] = (time.monotonic() + self.ttl, list(hits))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of this process"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    async def client_stats(self, redis, client_id: str) -> Dict[str, Any]:
+        """Hit rate of a client across all workers, from the flushed counters"""
+        data = await redis.hgetall(f"retrieval_cache_stats:{client_id}")
+        hits = int(data.get("hits", 0))
+        misses = int(data.get("misses", 0))
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total * 100, 1) if total else 0.0,
+        }
+
+    def _record(self, redis, client_id: str, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        counts = self._pending.setdefault(client_id, [0, 0])
+        counts[0 if hit else 1] += 1
+
+        # Counters reach Redis in periodic batches, off the search path
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self._last_flush = time.monotonic()
+            task = asyncio.create_task(self.flush(redis))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, redis):
+        """Add pending per-client hit/miss counts to their counters on each shard"""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            pipes = {}
+            for client_id, (hits, misses) in pending.items():
+                conn = redis.tenant(client_id)
+                if id(conn) not in pipes:
+                    pipes[id(conn)] = conn.pipeline(transaction=False)
+                key = f"retrieval_cache_stats:{client_id}"
+                pipes[id(conn)].hincrby(key, "hits", hits)
+                pipes[id(conn)].hincrby(key, "misses", misses)
+            for pipe in pipes.values():
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to write retrieval cache stats: {e}")
@@ -6,17 +6,20 @@ from fastapi import (
     File,
     WebSocket,
     Request,
+    Response,
+    BackgroundTasks,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 import hashlib
+import json
 import uuid
 import time
 from datetime import datetime
-import PyPDF2
-import io
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 from app.models import (
     ChatMessage,
     ChatResponse,
@@ -26,7 +29,16 @@ from app.models import (
 )
 from app.auth import get_current_user
 from app.redis_client import get_redis, RedisClient
-from app.utils import generate_ai_response
+from app.utils import (
+    ERROR_RESPONSE_PREFIX,
+    generate_ai_response,
+    stream_ai_response,
+)
+from app.context import context_builder
+from app.ingestion import ingestion_queue
+from app.memory import session_memory
+from app.pipeline import ChatInputs, chat_pipeline
+from app.singleflight import single_flight
 from app.webhook_utils import webhook_verifier
 import logging
 
@@ -36,92 +48,119 @@ logger = logging.getLogger(__name__)
 limiter = Limiter(key_func=get_remote_address)
 router = APIRouter()
 
+NO_CONTEXT_RESPONSE = "No relevant information found. Please upload more documents."
+
 
 @router.post("/chat", response_model=ChatResponse)
 @limiter.limit("10/minute")
-async def chat_endpoint(request:Request,chat_message: ChatMessage, redis: RedisClient = Depends(get_redis)
+async def chat_endpoint(request:Request,chat_message: ChatMessage, response: Response, background_tasks: BackgroundTasks, redis: RedisClient = Depends(get_redis)
 ):
     """Handle chat messages with semantic search and caching"""
+    start_time = time.time()
+
+    # Generate cache key
+    cache_key = _make_cache_key(chat_message.client_id, chat_message.message)
+
+    session_id = chat_message.session_id or str(uuid.uuid4())
+
+    # Config, embedding, retrieval and history lookups run concurrently
+    inputs = chat_pipeline.start(
+        redis, chat_message.client_id, chat_message.message, session_id
+    )
+
     try:
-        start_time = time.time()
-
-        # Generate cache key
-        cache_key = hashlib.md5(
-            f"{chat_message.client_id}:{chat_message.message}".encode()
-        ).hexdigest()
-
-        session_id = chat_message.session_id or str(uuid.uuid4())
-
-        # Check cache first
-        # cached_response = await redis.get_cached_response(cache_key)
-        # if cached_response:
-        #     # Track cache hit
-        #     # await redis.track_cache_hit(chat_message.client_id)
-        #
-        #     response_time = time.time() - start_time
-        #
-        #     # Store in session history even for cached responses
-        #     await redis.store_chat_message(
-        #         chat_message.client_id,
-        #         session_id,
-        #         chat_message.message,
-        #         cached_response,
-        #         response_time,
-        #     )
-        #
-        #     return ChatResponse(
-        #         response=cached_response,
-        #         session_id=session_id,
-        #         timestamp=datetime.now(),
-        #         cached=True,
-        #     )
-
-        # Track cache miss
-        # await redis.track_cache_miss(chat_message.client_id)
-
-        # Get client config
-        config = await redis.get_client_config(chat_message.client_id)
-        if not config or not config.enabled:
-            raise HTTPException(status_code=404, detail="Client not found or disabled")
-
-        # Perform semantic search
-        relevant_chunks = await redis.semantic_search(
-            chat_message.client_id, chat_message.message
+        config = await _get_enabled_config(inputs)
+
+        # Cached answers only count for the documents they were answered from,
+        # and never for sessions whose history shapes the answer
+        history = await inputs.history()
+        corpus_version = await _get_corpus_version(redis, chat_message.client_id)
+        query_embedding, cached_response = await _get_cached_response(
+            redis, inputs, chat_message.client_id, cache_key, corpus_version, history
         )
-
-        # Generate AI response
-        if not relevant_chunks:
-            await redis.cache_response(
-                cache_key,
-                "No relevant information found. Please upload more documents.",
+        if cached_response:
+            inputs.cancel()
+            response_time = time.time() - start_time
+
+            # Store in session history even for cached responses
+            await redis.store_chat_message(
+                chat_message.client_id,
+                session_id,
+                chat_message.message,
+                cached_response,
+                response_time,
+                cached=True,
             )
+            background_tasks.add_task(
+                session_memory.update,
+                redis,
+                chat_message.client_id,
+                session_id,
+                config.llm_provider,
+            )
+
+            response.headers["Server-Timing"] = inputs.server_timing()
             return ChatResponse(
-                response="No relevant information found. Please upload more documents.",
+                response=cached_response,
                 session_id=session_id,
                 timestamp=datetime.now(),
-                cached=False,
+                cached=True,
             )
 
-        # Add Chat memory in context
-        memory = await redis.get_chat_history(chat_message.client_id, session_id)
-        context = "Here is the current chat history:\n" + (memory or "")
+        async def generate() -> str:
+            relevant_chunks = await inputs.chunks()
+
+            # Generate AI response
+            if not relevant_chunks:
+                await redis.cache_response(cache_key, NO_CONTEXT_RESPONSE)
+                return NO_CONTEXT_RESPONSE
+
+            prompt = context_builder.build(
+                config.welcome_message,
+                history["turns"],
+                relevant_chunks,
+                history["summary"],
+            )
 
-        if relevant_chunks:
-            context += "\n\nRelevant context:\n" + "\n".join(relevant_chunks)
+            ai_response = await generate_ai_response(
+                chat_message.message,
+                prompt["context"],
+                prompt["welcome_message"],
+                config.llm_provider,
+            )
 
-            print(context)
-        print(memory)
+            # Cache response
+            await _cache_ai_response(
+                redis,
+                cache_key,
+                ai_response,
+                chat_message.client_id,
+                query_embedding,
+                corpus_version,
+                history,
+            )
+            return ai_response
 
-        ai_response = await generate_ai_response(
-            chat_message.message, context, config.welcome_message
+        # Identical questions in flight share a single generation; answers
+        # conditioned on a session's history are only shared within that session
+        flight_key = (
+            f"{cache_key}:{session_id}" if _uses_history(history) else cache_key
         )
+        ai_response, shared = await single_flight.do(redis.redis, flight_key, generate)
+        inputs.cancel()
+        response.headers["Server-Timing"] = inputs.server_timing()
+
+        if ai_response == NO_CONTEXT_RESPONSE:
+            return ChatResponse(
+                response=NO_CONTEXT_RESPONSE,
+                session_id=session_id,
+                timestamp=datetime.now(),
+                cached=False,
+            )
 
         # Calculate response time
         response_time = time.time() - start_time
 
-        # Cache response
-        await redis.cache_response(cache_key, ai_response)
-
         # Store in session history with response time
         await redis.store_chat_message(
             chat_message.client_id,
@@ -129,17 +168,269 @@ async def chat_endpoint(request:Request,chat_message: ChatMessage, redis: RedisC
             chat_message.message,
             ai_response,
             response_time,
+            cached=shared,
+        )
+
+        # Compact long sessions into a summary after the reply is sent
+        background_tasks.add_task(
+            session_memory.update,
+            redis,
+            chat_message.client_id,
+            session_id,
+            config.llm_provider,
         )
 
         return ChatResponse(
             response=ai_response,
             session_id=session_id,
             timestamp=datetime.now(),
-            cached=False,
+            cached=shared,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+    finally:
+        inputs.cancel()
+
+
+@router.post("/chat/stream")
+@limiter.limit("10/minute")
+async def chat_stream_endpoint(
+    request: Request, chat_message: ChatMessage, redis: RedisClient = Depends(get_redis)
+):
+    """Handle chat messages, streaming the AI response as Server-Sent Events"""
+    start_time = time.time()
+
+    cache_key = _make_cache_key(chat_message.client_id, chat_message.message)
+
+    session_id = chat_message.session_id or str(uuid.uuid4())
+
+    inputs = chat_pipeline.start(
+        redis, chat_message.client_id, chat_message.message, session_id
+    )
+
+    try:
+        config = await _get_enabled_config(inputs)
+
+        # Cached answers only count for the documents they were answered from,
+        # and never for sessions whose history shapes the answer
+        history = await inputs.history()
+        corpus_version = await _get_corpus_version(redis, chat_message.client_id)
+        query_embedding, cached_response = await _get_cached_response(
+            redis, inputs, chat_message.client_id, cache_key, corpus_version, history
+        )
+
+        relevant_chunks, prompt = [], None
+        if not cached_response:
+            relevant_chunks = await inputs.chunks()
+            if relevant_chunks:
+                prompt = context_builder.build(
+                    config.welcome_message,
+                    history["turns"],
+                    relevant_chunks,
+                    history["summary"],
+                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+    finally:
+        inputs.cancel()
+
+    def done_event(cached: bool) -> str:
+        return _sse_event(
+            {
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat(),
+                "cached": cached,
+            },
+            event="done",
+        )
+
+    turn_stored = False
+
+    async def event_stream():
+        nonlocal turn_stored
+        if cached_response:
+            yield _sse_event({"token": cached_response})
+            await redis.store_chat_message(
+                chat_message.client_id,
+                session_id,
+                chat_message.message,
+                cached_response,
+                time.time() - start_time,
+                cached=True,
+            )
+            turn_stored = True
+            yield done_event(cached=True)
+            return
+
+        if not relevant_chunks:
+            yield _sse_event({"token": NO_CONTEXT_RESPONSE})
+            await redis.cache_response(cache_key, NO_CONTEXT_RESPONSE)
+            yield done_event(cached=False)
+            return
+
+        parts = []
+        try:
+            async for token in stream_ai_response(
+                chat_message.message,
+                prompt["context"],
+                prompt["welcome_message"],
+                config.llm_provider,
+            ):
+                parts.append(token)
+                yield _sse_event({"token": token})
+        except Exception as e:
+            # A cut-off answer is neither cached nor stored as the session turn
+            logger.error(f"Streaming response failed: {e}")
+            yield _sse_event(
+                {"error": f"{ERROR_RESPONSE_PREFIX}: {str(e)}"}, event="error"
+            )
+            return
+
+        ai_response = "".join(parts)
+        response_time = time.time() - start_time
+
+        # Persist the complete turn once the model has finished streaming
+        await _cache_ai_response(
+            redis,
+            cache_key,
+            ai_response,
+            chat_message.client_id,
+            query_embedding,
+            corpus_version,
+            history,
+        )
+        await redis.store_chat_message(
+            chat_message.client_id,
+            session_id,
+            chat_message.message,
+            ai_response,
+            response_time,
+        )
+        turn_stored = True
+
+        yield done_event(cached=False)
+
+    async def update_memory():
+        # Compact long sessions into a summary after the stream has closed
+        if turn_stored:
+            await session_memory.update(
+                redis, chat_message.client_id, session_id, config.llm_provider
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        background=BackgroundTask(update_memory),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": inputs.server_timing(),
+        },
+    )
+
+
+def _make_cache_key(client_id: str, message: str) -> str:
+    """Cache key for a question, ignoring case and whitespace differences"""
+    normalized = " ".join(message.lower().split())
+    return hashlib.md5(f"{client_id}:{normalized}".encode()).hexdigest()
+
+
+def _uses_history(history: Dict[str, Any]) -> bool:
+    """Whether a session has earlier turns or a summary that shape its answers"""
+    return bool(history["turns"] or history["summary"])
+
+
+async def _get_enabled_config(inputs: ChatInputs) -> ClientConfig:
+    """Get client config, rejecting unknown or disabled clients"""
+    config = await inputs.config()
+    if not config or not config.enabled:
+        raise HTTPException(status_code=404, detail="Client not found or disabled")
+    return config
+
+
+async def _get_corpus_version(redis: RedisClient, client_id: str) -> Optional[int]:
+    """Version of a client's documents, or None if it can't be read"""
+    try:
+        corpus = await redis.get_corpus(client_id, read="get_semantic_cached_response")
+        return corpus["version"]
+    except Exception as e:
+        logger.error(f"Failed to get corpus version: {e}")
+        return None
+
+
+async def _get_cached_response(
+    redis: RedisClient,
+    inputs: ChatInputs,
+    client_id: str,
+    cache_key: str,
+    corpus_version: Optional[int],
+    history: Dict[str, Any],
+) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """Look up the exact then the semantic answer cache; returns the query
+    embedding too, which is None if a retrieval cache hit skipped it.
+
+    Sessions with history skip both, as their answers are never cached.
+    """
+    if _uses_history(history):
+        return None, None
+
+    if corpus_version is not None:
+        cached_response = await redis.get_exact_cached_response(
+            client_id, cache_key, corpus_version
+        )
+        if cached_response:
+            return None, cached_response
+
+    query_embedding = await inputs.embedding()
+    cached_response = await _get_semantic_cached_response(
+        redis, client_id, query_embedding, corpus_version
+    )
+    return query_embedding, cached_response
+
+
+async def _get_semantic_cached_response(
+    redis: RedisClient, client_id: str, query_embedding, corpus_version: Optional[int]
+) -> Optional[str]:
+    """Look up the semantic cache, skipped when the query embedding or corpus
+    version is unavailable"""
+    if query_embedding is None or corpus_version is None:
+        return None
+    return await redis.get_semantic_cached_response(
+        client_id, query_embedding, corpus_version
+    )
+
+
+async def _cache_ai_response(
+    redis: RedisClient,
+    cache_key: str,
+    ai_response: str,
+    client_id: str,
+    query_embedding,
+    corpus_version: Optional[int],
+    history: Dict[str, Any],
+):
+    """Cache a generated answer, keeping failed generations out of the semantic
+    cache and answers shaped by a session's history out of the cache entirely"""
+    if ai_response.startswith(ERROR_RESPONSE_PREFIX) or _uses_history(history):
+        return
+    await redis.cache_response(
+        cache_key,
+        ai_response,
+        client_id=client_id,
+        query_embedding=query_embedding,
+        corpus_version=corpus_version,
+    )
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format a Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
 
 
 @router.get("/config/{client_id}")
@@ -190,13 +481,13 @@ async def update_config(
 
 
 # NOT USED
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     user_data: dict = Depends(get_current_user),
     redis: RedisClient = Depends(get_redis),
 ):
-    """Upload and process PDF file"""
+    """Queue a PDF file for processing"""
     # Get user to find client_id
     user = await redis.get_user(user_data["sub"])
     if not user:
@@ -206,44 +497,39 @@ async def upload_pdf(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     try:
-        # Read PDF content
-        content = await file.read()
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-
-        # Extract text chunks
-        chunks = []
-        for page in pdf_reader.pages:
-            text = page.extract_text()
-            # Split into chunks of ~500 characters
-            chunk_size = 500
-            for i in range(0, len(text), chunk_size):
-                chunk = text[i : i + chunk_size].strip()
-                if chunk:
-                    chunks.append(chunk)
-
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No text content found in PDF")
-
-        filemeta = {
-            "filename": file.filename,
-            "size": len(content),
-            "num_pages": len(pdf_reader.pages),
-            "uploaded_at": datetime.now().isoformat(),
-        }
-
-        # Store chunks with embeddings (this will also update analytics)
-        await redis.store_chunks(user["client_id"], chunks, filemeta)
+        # Parsing and embedding happen in the ingestion worker
+        job_id = await ingestion_queue.enqueue(
+            redis, user["client_id"], file.filename, file
+        )
 
         return {
-            "message": f"PDF processed successfully. {len(chunks)} chunks stored.",
+            "message": "PDF queued for processing",
+            "job_id": job_id,
+            "status": "queued",
             "filename": file.filename,
-            "chunks_count": len(chunks),
-            "pages": len(pdf_reader.pages),
-            "file_size": len(content),
+            "file_size": file.size,
         }
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"PDF upload failed: {str(e)}")
+
+
+@router.get("/upload/jobs/{job_id}")
+async def get_upload_job(
+    job_id: str,
+    user_data: dict = Depends(get_current_user),
+    redis: RedisClient = Depends(get_redis),
+):
+    """Get the status of a queued PDF upload"""
+    user = await redis.get_user(user_data["sub"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    job = await ingestion_queue.get_job(redis, job_id)
+    if not job or job["client_id"] != user["client_id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
 
 
 @router.get("/analytics")
@@ -517,19 +803,18 @@ async def delete_file(
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
 
-@router.post("/upload/multiple")
+@router.post("/upload/multiple", status_code=202)
 async def upload_multiple_pdfs(
     files: List[UploadFile] = File(...),
     user_data: dict = Depends(get_current_user),
     redis: RedisClient = Depends(get_redis),
 ):
-    """Upload and process multiple PDF files"""
+    """Queue multiple PDF files for processing"""
     user = await redis.get_user(user_data["sub"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     results = []
-    total_chunks = 0
 
     for file in files:
         if not file.filename.endswith(".pdf"):
@@ -543,50 +828,16 @@ async def upload_multiple_pdfs(
             continue
 
         try:
-            # Read PDF content
-            content = await file.read()
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-
-            # Extract text chunks
-            chunks = []
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                # Split into chunks of ~500 characters
-                chunk_size = 500
-                for i in range(0, len(text), chunk_size):
-                    chunk = text[i : i + chunk_size].strip()
-                    if chunk:
-                        chunks.append(chunk)
-
-            if not chunks:
-                results.append(
-                    {
-                        "filename": file.filename,
-                        "status": "error",
-                        "message": "No text content found in PDF",
-                    }
-                )
-                continue
-
-            filemeta = {
-                "filename": file.filename,
-                "size": len(content),
-                "num_pages": len(pdf_reader.pages),
-                "uploaded_at": datetime.now().isoformat(),
-            }
-
-            # Store chunks with embeddings
-            file_id = await redis.store_chunks(user["client_id"], chunks, filemeta)
-            total_chunks += len(chunks)
+            job_id = await ingestion_queue.enqueue(
+                redis, user["client_id"], file.filename, file
+            )
 
             results.append(
                 {
                     "filename": file.filename,
-                    "status": "success",
-                    "file_id": file_id,
-                    "chunks_count": len(chunks),
-                    "pages": len(pdf_reader.pages),
-                    "file_size": len(content),
+                    "status": "queued",
+                    "job_id": job_id,
+                    "file_size": file.size,
                 }
             )
 
@@ -595,14 +846,13 @@ async def upload_multiple_pdfs(
                 {
                     "filename": file.filename,
                     "status": "error",
-                    "message": f"Processing failed: {str(e)}",
+                    "message": f"Upload failed: {str(e)}",
                 }
             )
 
-    successful_uploads = len([r for r in results if r["status"] == "success"])
+    queued_uploads = len([r for r in results if r["status"] == "queued"])
 
     return {
-        "message": f"Processed {len(files)} files. {successful_uploads} successful, {len(files) - successful_uploads} failed.",
-        "total_chunks_added": total_chunks,
+        "message": f"Received {len(files)} files. {queued_uploads} queued, {len(files) - queued_uploads} failed.",
         "results": results,
     }
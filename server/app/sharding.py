@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Hash on the primary Redis mapping client_id -> shard name
+TENANT_SHARDS_KEY = "tenant_shards"
+# Hash on the primary mapping client_id -> target shard while it is migrated
+TENANT_MIGRATIONS_KEY = "tenant_migrations"
+# Shard name used when REDIS_SHARDS is not set
+DEFAULT_SHARD = "default"
+
+
+def parse_shards(value: str) -> Dict[str, str]:
+    """Parse REDIS_SHARDS ("name=redis://host:port,...") into name -> URL"""
+    shards = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, url = entry.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid REDIS_SHARDS entry: {entry}")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes per shard"""
+
+    def __init__(self, nodes: List[str], vnodes: int = 100):
+        self._ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def get(self, key: str) -> str:
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._ring[index][1]
+
+
+class ShardRouter:
+    """Map each client to the Redis shard holding its documents and analytics.
+
+    Clients are placed on the hash ring when created and pinned in the
+    tenant_shards hash, so adding shards later doesn't move existing clients.
+    Migrations move a client by rewriting its entry there, after marking it
+    in tenant_migrations so no worker writes to it during the copy.
+    """
+
+    def __init__(self):
+        self.shard_urls = parse_shards(os.getenv("REDIS_SHARDS", ""))
+        self.shard_names = list(self.shard_urls) or [DEFAULT_SHARD]
+        self.ring = HashRing(
+            self.shard_names, int(os.getenv("REDIS_SHARD_VNODES", "100"))
+        )
+        # Seconds a worker may route with a stale copy of tenant_shards
+        self.routes_ttl = float(os.getenv("REDIS_SHARD_ROUTES_TTL", "5"))
+        self._routes: Dict[str, str] = {}
+        self._migrating: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._refreshing = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shard_names) > 1
+
+    def place(self, client_id: str) -> str:
+        """Shard the hash ring assigns to a client"""
+        return self.ring.get(client_id)
+
+    def shard_for(self, client_id: str, primary=None) -> str:
+        """Shard currently serving a client"""
+        if not self.sharded:
+            return self.shard_names[0]
+
+        if primary is not None and time.monotonic() - self._loaded_at > self.routes_ttl:
+            self._schedule_refresh(primary)
+
+        shard = self._routes.get(client_id)
+        if shard in self.shard_urls:
+            return shard
+        if shard:
+            logger.warning(f"Client {client_id} routed to unknown shard {shard}")
+        return self.place(client_id)
+
+    def migrating(self, client_id: str) -> bool:
+        """Whether a client's data is being copied to another shard"""
+        return self.sharded and client_id in self._migrating
+
+    async def refresh(self, primary):
+        """Reload routing and migration entries from the primary"""
+        pipe = primary.pipeline(transaction=True)
+        pipe.hgetall(TENANT_SHARDS_KEY)
+        pipe.hgetall(TENANT_MIGRATIONS_KEY)
+        self._routes, self._migrating = await pipe.execute()
+        self._loaded_at = time.monotonic()
+
+    def start(self, primary):
+        """Reload routes every routes_ttl, so idle workers never act on stale ones"""
+        if self.sharded and self._task is None:
+            self._task = asyncio.create_task(self._poll(primary))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def pin(
+        self, primary, client_id: str, shard: Optional[str] = None
+    ) -> str:
+        """Record a client's shard, keeping an existing entry unless one is given"""
+        if shard is None:
+            shard = self.place(client_id)
+            if not await primary.hsetnx(TENANT_SHARDS_KEY, client_id, shard):
+                shard = await primary.hget(TENANT_SHARDS_KEY, client_id)
+        else:
+            await primary.hset(TENANT_SHARDS_KEY, client_id, shard)
+        self._routes[client_id] = shard
+        return shard
+
+    async def unpin(self, primary, client_id: str):
+        await primary.hdel(TENANT_SHARDS_KEY, client_id)
+        self._routes.pop(client_id, None)
+
+    async def begin_migration(self, primary, client_id: str, target: str):
+        await primary.hset(TENANT_MIGRATIONS_KEY, client_id, target)
+        self._migrating[client_id] = target
+
+    async def finish_migration(self, primary, client_id: str, target: str):
+        """Route a client to its new shard and allow writes again, atomically"""
+        pipe = primary.pipeline(transaction=True)
+        pipe.hset(TENANT_SHARDS_KEY, client_id, target)
+        pipe.hdel(TENANT_MIGRATIONS_KEY, client_id)
+        await pipe.execute()
+        self._routes[client_id] = target
+        self._migrating.pop(client_id, None)
+
+    async def abort_migration(self, primary, client_id: str):
+        await primary.hdel(TENANT_MIGRATIONS_KEY, client_id)
+        self._migrating.pop(client_id, None)
+
+    async def _poll(self, primary):
+        while True:
+            await asyncio.sleep(self.routes_ttl)
+            await self._refresh_quietly(primary)
+
+    def _schedule_refresh(self, primary):
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        self._loaded_at = time.monotonic()  # Don't retry on every lookup if it fails
+        self._refreshing = asyncio.create_task(self._refresh_quietly(primary))
+
+    async def _refresh_quietly(self, primary):
+        try:
+            await self.refresh(primary)
+        except Exception as e:
+            logger.error(f"Failed to refresh tenant shard routes: {e}")
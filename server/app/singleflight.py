@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import uuid
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Delete the lock only if it is still held by the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls within a process and across workers"""
+
+    def __init__(self):
+        # Seconds the leader lock lives if its holder dies mid-generation
+        self.lock_ttl = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", "60"))
+        # Seconds followers wait for the leader's result before running it themselves
+        self.wait_timeout = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "30"))
+        # Seconds the leader's result stays readable for late followers
+        self.result_ttl = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "10"))
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(
+        self, redis, key: str, fn: Callable[[], Awaitable[str]]
+    ) -> Tuple[str, bool]:
+        """Run fn once per key; return its result and whether it was shared"""
+        while key in self._inflight:
+            result = await asyncio.shield(self._inflight[key])
+            if result is not None:
+                return result, True
+            # The leader's request was cancelled; retry, possibly as the new leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, shared = await self._do_distributed(redis, key, fn)
+            future.set_result(result)
+            return result, shared
+        except asyncio.CancelledError:
+            # Followers weren't cancelled themselves; let them retry instead
+            future.set_result(None)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a flight without local followers doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _do_distributed(
+        self, redis, key: str, fn: Callable[[], Awaitable[str]]
+    ) -> Tuple[str, bool]:
+        """Elect one leader across workers with a Redis lock, others await its result"""
+        if redis is None:
+            return await fn(), False
+
+        lock_key = f"singleflight:{key}:lock"
+        result_key = f"singleflight:{key}:result"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await redis.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            logger.error(f"Failed to acquire single-flight lock: {e}")
+            return await fn(), False
+
+        if acquired:
+            return await self._lead(redis, key, lock_key, result_key, token, fn), False
+
+        result = await self._follow(redis, key, result_key)
+        if result is not None:
+            return result, True
+
+        # Leader failed or timed out; answer this request on our own
+        return await fn(), False
+
+    async def _lead(
+        self,
+        redis,
+        key: str,
+        lock_key: str,
+        result_key: str,
+        token: str,
+        fn: Callable[[], Awaitable[str]],
+    ) -> str:
+        """Run fn and hand its outcome to followers"""
+        channel = f"singleflight:{key}"
+        try:
+            result = await fn()
+            payload = json.dumps({"result": result})
+        except BaseException as e:
+            payload = json.dumps({"error": str(e)})
+            await self._publish(redis, channel, result_key, payload)
+            raise
+        else:
+            await self._publish(redis, channel, result_key, payload)
+            return result
+        finally:
+            try:
+                await redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.error(f"Failed to release single-flight lock: {e}")
+
+    async def _publish(self, redis, channel: str, result_key: str, payload: str):
+        """Publish the outcome and keep it briefly for followers that subscribe late"""
+        try:
+            pipe = redis.pipeline()
+            pipe.setex(result_key, self.result_ttl, payload)
+            pipe.publish(channel, payload)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish single-flight result: {e}")
+
+    async def _follow(self, redis, key: str, result_key: str) -> Optional[str]:
+        """Wait for the leader's result, or None if it failed or timed out"""
+        channel = f"singleflight:{key}"
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+
+            # The leader may have finished before we subscribed
+            payload = await redis.get(result_key)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.wait_timeout
+            while payload is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"Timed out waiting for single-flight {key}")
+                    return None
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=remaining
+                )
+                if message and message["type"] == "message":
+                    payload = message["data"]
+
+            data = json.loads(payload)
+            return data.get("result")
+
+        except Exception as e:
+            logger.error(f"Failed to wait for single-flight result: {e}")
+            return None
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
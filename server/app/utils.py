@@ -1,51 +1,14 @@
-from google import genai
-import os
+from typing import AsyncIterator, Dict, List, Optional
+from app.llm import llm_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# async def generate_ai_response(
-#     message: str, context: str = "", welcome_msg: str = ""
-# ) -> str:
-#     """Generate AI response using local Ollama server"""
+ERROR_RESPONSE_PREFIX = "Error generating response"
 
-#     system_prompt = f"""You are a helpful AI assistant.
-#     Welcome message: {welcome_msg}
 
-#     Context from documents along with chat history:
-#     {context}
-
-#     Please provide a helpful response based on the context provided.
-#     If the context doesn't contain relevant information, provide a general helpful response.
-#     Don't mention 'context' word
-#     """
-
-#     try:
-#         response = requests.post(
-#             "http://localhost:11434/api/generate",
-#             json={
-#                 "model": "gemma3:1b",  # or "llama2", "gemma", etc.
-#                 "prompt": message,
-#                 "system": system_prompt,
-#                 "stream": False,
-#             },
-#         )
-#         if response.status_code == 200:
-#             return response.json()["response"]
-#         else:
-#             return f"Sorry, I encountered an error. Please try again later."
-
-#     except Exception as e:
-#         return f"Error generating response: {str(e)}"
-
-
-# Configure the API key
-
-
-async def generate_ai_response(
-    message: str, context: str = "", welcome_msg: str = ""
-) -> str:
-    """Generate AI response using Google Gemini 2.5 Flash-Lite API"""
+def _build_prompt(message: str, context: str = "", welcome_msg: str = "") -> str:
+    """Build the full LLM prompt for a chat turn"""
 
     system_prompt = f"""You are a helpful AI assistant.
     Welcome message: {welcome_msg}
@@ -58,16 +21,68 @@ async def generate_ai_response(
     Don't mention 'context' word
     """
 
+    return f"{system_prompt}\n\nUser: {message}\n\nAssistant:"
+
+
+async def generate_ai_response(
+    message: str,
+    context: str = "",
+    welcome_msg: str = "",
+    provider: Optional[str] = None,
+) -> str:
+    """Generate AI response with the client's LLM provider (Gemini by default)"""
+
     try:
-        full_prompt = f"{system_prompt}\n\nUser: {message}\n\nAssistant:"
+        full_prompt = _build_prompt(message, context, welcome_msg)
+
+        return await llm_client.generate(full_prompt, provider=provider)
 
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    except Exception as e:
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+
+
+async def stream_ai_response(
+    message: str,
+    context: str = "",
+    welcome_msg: str = "",
+    provider: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Stream AI response text chunks from the client's LLM provider as they are generated.
+
+    Errors are raised rather than streamed, possibly after some chunks were
+    yielded, so callers can tell a cut-off answer from a complete one.
+    """
+
+    full_prompt = _build_prompt(message, context, welcome_msg)
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite", contents=full_prompt
-        )
+    async for chunk in llm_client.stream(full_prompt, provider=provider):
+        yield chunk
 
-        return response.text
+
+async def summarize_conversation(
+    summary: str, turns: List[Dict[str, str]], provider: Optional[str] = None
+) -> str:
+    """Fold older chat turns into a running conversation summary with the
+    client's LLM provider"""
+
+    transcript = "".join(
+        f"User: {turn.get('message', '')}\nAI: {turn.get('response', '')}\n\n"
+        for turn in turns
+    )
+
+    prompt = f"""Update the summary of a customer support conversation.
+    Keep facts the user shared, questions asked and answers given. Be concise.
+
+    Current summary:
+    {summary or "(none)"}
+
+    New turns:
+    {transcript}
+
+    Updated summary:"""
+
+    try:
+        return (await llm_client.generate(prompt, provider=provider)).strip()
 
     except Exception as e:
-        return f"Error generating response: {str(e)}"
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
@@ -0,0 +1,55 @@
+"""Micro-benchmark for prompt context assembly.
+
+Run from the server directory:
+
+    python -m benchmarks.bench_context
+"""
+
+import random
+import string
+import time
+
+from app.context import ContextBuilder
+
+
+def random_text(length: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(
+            "".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10)))
+        )
+    return " ".join(words)[:length]
+
+
+def main():
+    random.seed(0)
+    builder = ContextBuilder()
+
+    for num_turns, num_chunks in [(5, 3), (50, 10), (50, 50)]:
+        turns = [
+            {
+                "timestamp": "2025-01-01T00:00:00",
+                "message": random_text(200),
+                "response": random_text(800),
+            }
+            for _ in range(num_turns)
+        ]
+        chunks = [{"content": random_text(500)} for _ in range(num_chunks)]
+        # Retrieval often returns overlapping chunks; include some duplicates
+        chunks += chunks[: num_chunks // 3]
+
+        iterations = 2000
+        start = time.perf_counter()
+        for _ in range(iterations):
+            prompt = builder.build("Hello! How can I help you today?", turns, chunks)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"turns={num_turns:3d} chunks={len(chunks):3d} "
+            f"-> {elapsed / iterations * 1e6:8.1f} us/build, "
+            f"tokens={prompt['tokens']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""PDF extraction throughput by pool size, event loop lag and peak memory.
+
+Loop lag is how late a 5 ms timer fires while documents are being parsed; it
+bounds the extra latency every concurrent request on the loop sees. Peak RSS
+is that of a fresh process running one pool task (a page range read from the
+file) versus parsing the whole document from memory. Both grow with document
+size, since PyPDF2 parses the full page tree either way. Run from the server
+directory:
+
+    python -m benchmarks.bench_pdf_extraction
+"""
+
+import asyncio
+import io
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import PyPDF2
+
+from app.extraction import PdfExtractor, extract_chunks
+
+NUM_PAGES = 400
+LINES_PER_PAGE = 45
+TICK_MS = 5
+
+
+def build_pdf(num_pages: int) -> bytes:
+    """A text-only PDF with num_pages pages of filler lines"""
+    words = "retrieval augmented answers from uploaded documents".split()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(num_pages):
+        lines = [
+            f"({' '.join(words[(page + line + i) % len(words)] for i in range(12))}) Tj T*"
+            for line in range(LINES_PER_PAGE)
+        ]
+        stream = ("BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, num_pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def write_pdf(num_pages: int) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(build_pdf(num_pages))
+    return f.name
+
+
+def peak_rss_mb(path: str, whole: bool) -> float:
+    if whole:
+        with open(path, "rb") as f:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(f.read()))
+        for page in pdf_reader.pages:
+            page.extract_text()
+    else:
+        extract_chunks(path, 0, PdfExtractor().pages_per_task)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure_lag(work) -> float:
+    """p99 timer lateness in ms while work runs"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_MS / 1000)
+            lags.append((time.perf_counter() - start) * 1000 - TICK_MS)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # Let the first timer start
+    await work()
+    done.set()
+    await task
+    return float(np.percentile(lags, 99)) if lags else 0.0
+
+
+async def main():
+    path, warmup = write_pdf(NUM_PAGES), write_pdf(1)
+    print(f"{NUM_PAGES} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+
+    pool_sizes = sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"\n{'processes':>9} {'pages/s':>9} {'speedup':>8}")
+    baseline = None
+    for processes in pool_sizes:
+        extractor = PdfExtractor()
+        extractor.processes = processes
+        await extractor.extract(warmup)  # Start the processes
+        start = time.perf_counter()
+        chunks, _ = await extractor.extract(path)
+        rate = NUM_PAGES / (time.perf_counter() - start)
+        extractor.close()
+        baseline = baseline or rate
+        print(f"{processes:>9} {rate:>9.0f} {rate / baseline:>7.2f}x")
+
+    extractor = PdfExtractor()
+    await extractor.extract(warmup)
+
+    async def in_loop():
+        extract_chunks(path)
+
+    async def in_thread():
+        await asyncio.to_thread(extract_chunks, path)
+
+    async def in_pool():
+        await extractor.extract(path)
+
+    print(f"\n{'extraction':>10} {'p99 loop lag ms':>16}")
+    for name, work in [("in loop", in_loop), ("thread", in_thread), ("pool", in_pool)]:
+        print(f"{name:>10} {await measure_lag(work):>16.1f}")
+    extractor.close()
+
+    print(f"\n{'pages':>6} {'MB':>6} {'task RSS MB':>12} {'whole RSS MB':>13}")
+    for num_pages in [NUM_PAGES // 4, NUM_PAGES, NUM_PAGES * 8]:
+        sample = write_pdf(num_pages)
+        rss = []
+        for whole in [False, True]:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                rss.append(pool.submit(peak_rss_mb, sample, whole).result())
+        size_mb = os.path.getsize(sample) / 1e6
+        print(f"{num_pages:>6} {size_mb:>6.1f} {rss[0]:>12.1f} {rss[1]:>13.1f}")
+        os.remove(sample)
+
+    os.remove(path)
+    os.remove(warmup)
+    print(f"\n{len(chunks)} chunks per document")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
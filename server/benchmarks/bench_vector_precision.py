@@ -0,0 +1,156 @@
+"""Recall, memory and search latency of FLOAT32, FLOAT16 and INT8 chunk vectors.
+
+The first table scores exhaustively, so it isolates the loss from
+quantization rather than from HNSW. With --redis, each precision is also
+loaded into a temporary HNSW index built like chunks_idx, and the second
+table reports KNN latency and recall against the exact FLOAT32 neighbours.
+Run from the server directory:
+
+    python -m benchmarks.bench_vector_precision [--redis redis://localhost:6379]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import redis
+from redis.commands.search.field import VectorField
+from redis.commands.search.index_definition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+from app.embeddings import decode_vector, encode_vector
+
+DIM = 768
+NUM_CHUNKS = 20000
+NUM_QUERIES = 200
+TOP_K = 3
+RERANK_CANDIDATES = 4
+HNSW_PARAMS = {"M": 16, "EF_CONSTRUCTION": 200, "EF_RUNTIME": 10}
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(e)) / TOP_K for f, e in zip(found, exact)]))
+
+
+def rerank(queries: np.ndarray, chunks: np.ndarray, candidates: np.ndarray):
+    """Re-order candidate ids by their full-precision similarity"""
+    full = np.einsum("qd,qcd->qc", queries, chunks[candidates])
+    order = np.argsort(-full, axis=1)[:, :TOP_K]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def bench_hnsw(url: str, chunks: np.ndarray, queries: np.ndarray, exact: np.ndarray):
+    conn = redis.Redis.from_url(url)
+    print(f"\n{'type':8s} {'rerank':>6} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for vector_type in ["FLOAT32", "FLOAT16", "INT8"]:
+        index = f"bench_vectors_{vector_type.lower()}"
+        prefix = f"bench_vector:{vector_type}:"
+        conn.ft(index).create_index(
+            fields=[
+                VectorField(
+                    "embedding",
+                    "HNSW",
+                    {
+                        "TYPE": vector_type,
+                        "DIM": DIM,
+                        "DISTANCE_METRIC": "COSINE",
+                        **HNSW_PARAMS,
+                    },
+                )
+            ],
+            definition=IndexDefinition(prefix=[prefix], index_type=IndexType.HASH),
+        )
+        try:
+            for start in range(0, NUM_CHUNKS, 1000):
+                pipe = conn.pipeline(transaction=False)
+                for i in range(start, min(start + 1000, NUM_CHUNKS)):
+                    vector = encode_vector(chunks[i], vector_type)
+                    pipe.hset(f"{prefix}{i}", "embedding", vector)
+                pipe.execute()
+
+            for use_rerank in [False, True]:
+                k = TOP_K * RERANK_CANDIDATES if use_rerank else TOP_K
+                query = (
+                    Query(f"*=>[KNN {k} @embedding $vec AS score]")
+                    .sort_by("score")
+                    .return_fields("score")
+                    .paging(0, k)
+                    .dialect(2)
+                )
+                latencies, found = [], []
+                for vector in queries:
+                    start = time.perf_counter()
+                    docs = conn.ft(index).search(
+                        query, query_params={"vec": encode_vector(vector, vector_type)}
+                    ).docs
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    ids = [int(doc.id[len(prefix) :]) for doc in docs]
+                    found.append((ids + [-1] * k)[:k])
+
+                found = np.array(found)
+                if use_rerank:
+                    found = rerank(queries, chunks, found)
+                print(
+                    f"{vector_type:8s} {str(use_rerank):>6} "
+                    f"{recall_at_k(found, exact):>7.4f} "
+                    f"{np.percentile(latencies, 50):>7.2f} "
+                    f"{np.percentile(latencies, 99):>7.2f}"
+                )
+        finally:
+            conn.ft(index).dropindex(delete_documents=True)
+
+
+def main(url: str = None):
+    rng = np.random.default_rng(0)
+    # Clustered vectors resemble real embeddings better than uniform noise
+    centers = rng.normal(size=(64, DIM))
+    chunks = normalize(
+        centers[rng.integers(0, 64, NUM_CHUNKS)] + 0.5 * rng.normal(size=(NUM_CHUNKS, DIM))
+    ).astype(np.float32)
+    queries = normalize(
+        chunks[rng.integers(0, NUM_CHUNKS, NUM_QUERIES)]
+        + 0.3 * rng.normal(size=(NUM_QUERIES, DIM))
+    ).astype(np.float32)
+
+    exact = top_k(queries @ chunks.T, TOP_K)
+
+    for vector_type in ["FLOAT32", "FLOAT16", "INT8"]:
+        start = time.perf_counter()
+        encoded = [encode_vector(v, vector_type) for v in chunks]
+        encode_ms = (time.perf_counter() - start) * 1000
+        stored = np.stack([decode_vector(raw, vector_type) for raw in encoded])
+        stored = normalize(stored.astype(np.float32))
+        size_mb = sum(len(raw) for raw in encoded) / 1e6
+
+        scores = queries @ stored.T
+        for use_rerank in [False, True]:
+            if use_rerank:
+                found = rerank(
+                    queries, chunks, top_k(scores, TOP_K * RERANK_CANDIDATES)
+                )
+            else:
+                found = top_k(scores, TOP_K)
+
+            print(
+                f"{vector_type:8s} rerank={str(use_rerank):5s} "
+                f"-> recall@{TOP_K}={recall_at_k(found, exact):.4f}, "
+                f"vectors={size_mb:6.1f} MB, encode={encode_ms:7.1f} ms"
+            )
+
+    if url:
+        bench_hnsw(url, chunks, queries, exact)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis", help="Redis Stack URL for the HNSW comparison")
+    args = parser.parse_args()
+    main(args.redis)
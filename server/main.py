@@ -9,7 +9,10 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.routes import router, limiter
-from app.redis_client import init_redis, close_redis
+from app.redis_client import init_redis, close_redis, redis_client
+from app.pipeline import chat_pipeline
+from app.llm import close_llm
+from app.ingestion import UploadLimitMiddleware
 from app.models import RedisError
 import logging
 
@@ -22,13 +25,16 @@ async def lifespan(app: FastAPI):
     # Startup
     try:
         await init_redis()
+        chat_pipeline.listen(redis_client)
     except RedisError as e:
         print(f"Redis connection failed during startup: {e}")
         print("Application will continue without Redis functionality")
     yield
     # Shutdown
     print("Shutting down application...")
+    await chat_pipeline.close()
     await close_redis()
+    await close_llm()
     pass
 
 app = FastAPI(
@@ -41,6 +47,8 @@ app = FastAPI(
     openapi_url=None,
 )
 
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
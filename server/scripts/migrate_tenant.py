@@ -0,0 +1,69 @@
+"""Move a client's data to another Redis shard, or pin existing clients.
+
+Shards are configured with REDIS_SHARDS=name=redis://host:port,... Clients
+are pinned to a shard when created. Before first enabling sharding or adding
+shards, pin the clients created earlier to the shard that holds them:
+
+    python -m scripts.migrate_tenant --pin-all shard0
+
+Then move a client with pipelined DUMP/RESTORE and switch its routing entry:
+
+    python -m scripts.migrate_tenant client_0123456789ab --to shard1
+
+Each worker refuses writes for the client (uploads, chat history,
+analytics) once it reloads routes, within REDIS_SHARD_ROUTES_TTL seconds,
+and the copy starts after that, so no update is lost. Writes resume on the
+new shard when the copy finishes. The old shard keeps its copy unless
+--delete-source is given.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+
+def print_progress(copied: int):
+    print(f"\rCopied: {copied}", end="", flush=True)
+
+
+async def main(args):
+    await redis_client.connect()
+    try:
+        if args.pin_all:
+            pinned = await redis_client.pin_tenants(args.pin_all)
+            print(f"Pinned {pinned} clients to {args.pin_all}")
+            return
+
+        copied = await redis_client.migrate_tenant(
+            args.client_id,
+            args.to,
+            batch_size=args.batch_size,
+            delete_source=args.delete_source,
+            on_progress=print_progress,
+        )
+        print(f"\nMoved {copied} keys of {args.client_id} to {args.to}")
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("client_id", nargs="?")
+    parser.add_argument("--to", help="target shard name")
+    parser.add_argument(
+        "--pin-all", metavar="SHARD", help="pin clients without a routing entry"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--delete-source",
+        action="store_true",
+        help="delete the keys on the old shard once every worker uses the new one",
+    )
+    args = parser.parse_args()
+    if not args.pin_all and not (args.client_id and args.to):
+        parser.error("either client_id with --to, or --pin-all is required")
+    asyncio.run(main(args))
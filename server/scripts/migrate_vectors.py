@@ -0,0 +1,54 @@
+"""Add vectors in the configured precision and dimension to existing chunks.
+
+Chunks keep their float32 "embedding" field and gain a field for the new
+VECTOR_TYPE / VECTOR_COARSE_DIM (e.g. embedding_f16 or embedding_256), so
+the current index keeps serving during the migration. Run from the server
+directory:
+
+    VECTOR_TYPE=FLOAT16 python -m scripts.migrate_vectors
+    VECTOR_TYPE=FLOAT16 python -m scripts.rebuild_index
+
+The API queries whichever vector field chunks_idx indexes when it starts,
+and writes both fields meanwhile, so it can be deployed with the new
+settings first and restarted after the swap. Run the migration once more
+to pick up chunks uploaded in between. With VECTOR_RERANK=false,
+--drop-full removes the float32 copies afterwards.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+
+def print_progress(migrated: int):
+    print(f"\rMigrated: {migrated}", end="", flush=True)
+
+
+async def main(batch_size: int, drop_full: bool):
+    if drop_full and redis_client.vector_rerank:
+        raise SystemExit("--drop-full requires VECTOR_RERANK=false")
+
+    await redis_client.connect()
+    try:
+        migrated = await redis_client.migrate_chunk_vectors(
+            batch_size=batch_size, drop_full=drop_full, on_progress=print_progress
+        )
+        print(f"\nMigrated {migrated} chunks to {redis_client.vector_type}")
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--drop-full",
+        action="store_true",
+        help="delete float32 vectors once reduced ones exist",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.drop_full))
@@ -0,0 +1,45 @@
+"""Rebuild the chunk vector index with the current HNSW settings.
+
+Builds chunks_idx_v{N+1} over the existing chunk hashes while the current
+index keeps serving, then points the chunks_idx alias at it. Run from the
+server directory:
+
+    HNSW_M=32 HNSW_EF_CONSTRUCTION=400 python -m scripts.rebuild_index
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+
+def print_progress(shard: str, progress: float):
+    print(f"\rIndexing {shard}: {progress * 100:5.1f}%", end="", flush=True)
+
+
+async def main(keep_old: bool, poll_interval: float):
+    await redis_client.connect()
+    try:
+        new_indexes = await redis_client.rebuild_vector_index(
+            keep_old=keep_old, poll_interval=poll_interval, on_progress=print_progress
+        )
+        print()
+        for shard, new_index in new_indexes.items():
+            print(f"{shard}: chunks_idx now points at {new_index}")
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--keep-old", action="store_true", help="keep the previous index version"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0, help="seconds between progress checks"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.keep_old, args.poll_interval))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The app reads its settings at import time; tests never reach these services
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("CLERK_SECRET_KEY", "test")
+os.environ.setdefault("CLERK_PUBLISHABLE_KEY", "test")
+os.environ.setdefault("CLERK_JWKS_URL", "http://localhost/jwks")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,227 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.embeddings import (
+    EmbeddingBatcher,
+    EmbeddingCache,
+    EmbeddingScheduler,
+    TokenBucket,
+    decode_vector,
+    encode_vector,
+    is_transient,
+    vector_field_spec,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+def test_vector_field_spec():
+    assert vector_field_spec("embedding", 768) == ("FLOAT32", 768)
+    assert vector_field_spec("embedding_f16_256", 768) == ("FLOAT16", 256)
+    assert vector_field_spec("embedding_i8", 768) == ("INT8", 768)
+    assert vector_field_spec("vector", 768) is None
+
+
+def test_encode_decode_round_trip():
+    vector = np.array([0.5, -0.25, 1.0, 0.0], dtype=np.float32)
+
+    assert np.array_equal(decode_vector(encode_vector(vector)), vector)
+    assert np.allclose(
+        decode_vector(encode_vector(vector, "FLOAT16"), "FLOAT16"), vector
+    )
+
+    int8 = decode_vector(encode_vector(vector, "INT8"), "INT8")
+    assert int8.dtype == np.float32
+    assert np.abs(int8).max() <= 127
+    cosine = int8 @ vector / (np.linalg.norm(int8) * np.linalg.norm(vector))
+    assert cosine > 0.999
+
+
+def test_batcher_routes_vectors_and_dedupes():
+    calls = []
+
+    async def embed_fn(texts):
+        calls.append(list(texts))
+        return [np.full(2, len(text), dtype=np.float32) for text in texts]
+
+    async def main():
+        batcher = EmbeddingBatcher(embed_fn)
+        return await asyncio.gather(
+            batcher.embed("a"), batcher.embed("bbb"), batcher.embed("a")
+        )
+
+    vectors = asyncio.run(main())
+
+    assert calls == [["a", "bbb"]]
+    assert [vector[0] for vector in vectors] == [1, 3, 1]
+
+
+def test_batcher_fails_every_waiter_on_length_mismatch():
+    async def embed_fn(texts):
+        return [np.zeros(2, dtype=np.float32)]
+
+    async def main():
+        batcher = EmbeddingBatcher(embed_fn)
+        return await asyncio.wait_for(
+            asyncio.gather(
+                batcher.embed("a"), batcher.embed("b"), return_exceptions=True
+            ),
+            timeout=1,
+        )
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_batcher_fails_every_waiter_on_provider_error():
+    async def embed_fn(texts):
+        raise StatusError(500)
+
+    async def main():
+        batcher = EmbeddingBatcher(embed_fn)
+        return await asyncio.wait_for(
+            asyncio.gather(
+                batcher.embed("a"), batcher.embed("b"), return_exceptions=True
+            ),
+            timeout=1,
+        )
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, StatusError) for result in results)
+
+
+def test_is_transient():
+    assert is_transient(StatusError(429))
+    assert is_transient(StatusError(503))
+    assert not is_transient(StatusError(400))
+    assert not is_transient(ValueError("bad input"))
+    assert is_transient(ConnectionError("reset"))
+
+
+def test_token_bucket_waits_for_refill():
+    async def main():
+        bucket = TokenBucket(rate=100, capacity=1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bucket.acquire()
+        await bucket.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(main()) >= 0.009
+
+
+def test_token_bucket_disabled():
+    async def main():
+        bucket = TokenBucket(rate=0, capacity=1)
+        for _ in range(100):
+            await bucket.acquire()
+
+    asyncio.run(main())
+
+
+def test_scheduler_retries_transient_errors(monkeypatch):
+    monkeypatch.setenv("EMBED_INGEST_BATCH_SIZE", "2")
+    monkeypatch.setenv("EMBED_RETRY_BASE_DELAY", "0")
+    attempts = {}
+
+    async def embed_fn(texts):
+        attempts[texts[0]] = attempts.get(texts[0], 0) + 1
+        if attempts[texts[0]] == 1:
+            raise StatusError(429)
+        return [np.zeros(2, dtype=np.float32) for _ in texts]
+
+    async def main():
+        scheduler = EmbeddingScheduler(embed_fn)
+        batches = [item async for item in scheduler.stream(list("abcde"))]
+        return scheduler, batches
+
+    scheduler, batches = asyncio.run(main())
+
+    assert sorted(offset for offset, _ in batches) == [0, 2, 4]
+    assert sum(len(vectors) for _, vectors in batches) == 5
+    assert scheduler.stats() == {"batches": 3, "retries": 3}
+
+
+def test_scheduler_raises_permanent_errors(monkeypatch):
+    monkeypatch.setenv("EMBED_RETRY_BASE_DELAY", "0")
+    calls = []
+
+    async def embed_fn(texts):
+        calls.append(texts)
+        raise StatusError(400)
+
+    async def main():
+        scheduler = EmbeddingScheduler(embed_fn)
+        return [item async for item in scheduler.stream(["a"])]
+
+    with pytest.raises(StatusError):
+        asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_cache_tiers():
+    redis = FakeRedis()
+    vector = np.array([1, 2, 3], dtype=np.float32)
+
+    async def main():
+        cache = EmbeddingCache("model", 3)
+        assert await cache.get(redis, "Hello  World") is None
+        await cache.set(redis, "hello world", vector)
+        assert np.array_equal(await cache.get(redis, "HELLO world"), vector)
+
+        # A fresh process only has the Redis tier
+        other = EmbeddingCache("model", 3)
+        assert np.array_equal(await other.get(redis, "hello world"), vector)
+        assert np.array_equal(await other.get(redis, "hello world"), vector)
+        return cache.stats(), other.stats()
+
+    stats, other_stats = asyncio.run(main())
+
+    assert stats["misses"] == 1 and stats["local_hits"] == 1
+    assert other_stats["redis_hits"] == 1 and other_stats["local_hits"] == 1
+
+
+def test_cache_ignores_vectors_of_another_dimension():
+    redis = FakeRedis()
+
+    async def main():
+        await EmbeddingCache("model", 3).set(redis, "text", np.zeros(3))
+        small = EmbeddingCache("model", 3)
+        small.dim = 2  # Same key, different expected size
+        return await small.get(redis, "text")
+
+    assert asyncio.run(main()) is None
+
+
+def test_cache_local_lru_is_bounded(monkeypatch):
+    monkeypatch.setenv("EMBED_CACHE_LOCAL_SIZE", "2")
+
+    async def main():
+        cache = EmbeddingCache("model", 1)
+        for text in ["a", "b", "c"]:
+            await cache.set(None, text, np.zeros(1))
+        return cache, await cache.get(None, "a")
+
+    cache, evicted = asyncio.run(main())
+
+    assert evicted is None
+    assert cache.stats()["local_size"] == 2
@@ -0,0 +1,205 @@
+import asyncio
+
+import numpy as np
+from redis.commands.search.document import Document
+
+from app.context import ContextBuilder, estimate_tokens
+from app.extraction import CHUNK_SIZE, split_text
+from app.local_search import LocalSearch, TenantMatrix
+from app.redis_client import (
+    _join_passages,
+    merge_adjacent_hits,
+    reciprocal_rank_fusion,
+)
+from app.retrieval_cache import RetrievalCache
+
+
+def hit(file_id, chunk_index, content, score=0.1):
+    return {
+        "file_id": file_id,
+        "filename": f"{file_id}.pdf",
+        "chunk_index": chunk_index,
+        "content": content,
+        "score": score,
+    }
+
+
+def test_split_text_cuts_at_whitespace():
+    words = [f"word{i}" for i in range(300)]
+    chunks = split_text(" ".join(words))
+
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    assert " ".join(chunks).split() == words
+
+
+def test_split_text_hard_cuts_unbroken_text():
+    chunks = split_text("x" * (CHUNK_SIZE * 2 + 10))
+
+    assert [len(chunk) for chunk in chunks] == [CHUNK_SIZE, CHUNK_SIZE, 10]
+
+
+def test_split_text_skips_blank_text():
+    assert split_text("") == []
+    assert split_text("   \n\t ") == []
+
+
+def test_join_passages():
+    assert _join_passages("end of one", "start of two") == "end of one start of two"
+    assert _join_passages("abc def", "def ghi", overlap=3) == "abc def ghi"
+    # Only a repeat of exactly the overlap is dropped
+    assert _join_passages("abc de", "def ghi", overlap=3) == "abc de def ghi"
+
+
+def test_merge_adjacent_hits():
+    hits = [
+        hit("b", 4, "lonely", score=0.2),
+        hit("a", 2, "second", score=0.3),
+        hit("a", 1, "first", score=0.1),
+        hit("a", 2, "second", score=0.3),
+    ]
+
+    merged = merge_adjacent_hits(hits)
+
+    assert [m["content"] for m in merged] == ["lonely", "first second"]
+    assert merged[1]["chunk_indexes"] == [1, 2]
+    assert merged[1]["chunk_index"] == 1
+    assert merged[1]["score"] == 0.3
+
+
+def test_merge_adjacent_hits_keeps_gaps_apart():
+    merged = merge_adjacent_hits([hit("a", 1, "one"), hit("a", 3, "three")])
+
+    assert [m["content"] for m in merged] == ["one", "three"]
+
+
+def test_reciprocal_rank_fusion():
+    vector = [Document("a", score="0.1"), Document("b", score="0.2")]
+    text = [Document("b"), Document("c")]
+
+    fused = reciprocal_rank_fusion([(vector, 1.0), (text, 1.0)], top_k=3)
+
+    assert [doc.id for doc in fused] == ["b", "a", "c"]
+    # The vector copy of a doc found by both is kept, for its score
+    assert fused[0].score == "0.2"
+    assert [doc.id for doc in reciprocal_rank_fusion([(text, 1.0)], 1)] == ["b"]
+
+
+def test_context_builder_prefers_newest_turns(monkeypatch):
+    monkeypatch.setenv("CONTEXT_HISTORY_TOKENS", "40")
+    builder = ContextBuilder()
+    turns = [
+        {"timestamp": str(i), "message": f"question {i}", "response": "x" * 40}
+        for i in range(5)
+    ]
+
+    prompt = builder.build("welcome", turns, [])
+
+    assert "question 4" in prompt["context"]
+    assert "question 0" not in prompt["context"]
+    assert prompt["tokens"]["history"] <= 40
+
+
+def test_context_builder_chunk_budget(monkeypatch):
+    monkeypatch.setenv("CONTEXT_CHUNK_TOKENS", "10")
+    builder = ContextBuilder()
+    chunks = [
+        {"content": "a" * 100},
+        {"content": "b" * 20},
+        {"content": "c" * 4},
+    ]
+
+    prompt = builder.build("welcome", [], chunks)
+
+    # The best chunk is truncated to fit; later ones no longer do
+    assert "a" * 40 in prompt["context"]
+    assert "a" * 41 not in prompt["context"]
+    assert "b" not in prompt["context"].split("Relevant context:")[1]
+    assert prompt["tokens"]["chunks"] == 10
+
+
+def test_context_builder_dedupes_chunks():
+    chunks = [{"content": "Same  text"}, {"content": "same text"}, {"content": " "}]
+
+    prompt = ContextBuilder().build("", [], chunks)
+
+    assert prompt["tokens"]["chunks"] == estimate_tokens("Same  text")
+
+
+def test_context_builder_keeps_summary():
+    prompt = ContextBuilder().build("", [], [], summary="earlier facts")
+
+    assert "earlier facts" in prompt["context"]
+
+
+def test_local_search_top_k():
+    search = LocalSearch()
+    vectors = np.eye(3, dtype=np.float32)
+    docs = [{"id": f"chunk:{i}", "content": str(i)} for i in range(3)]
+    search._store("client", TenantMatrix(1, vectors, docs))
+
+    async def main():
+        return await search.search(None, "client", 1, np.array([0.1, 1.0, 0.5]), 2)
+
+    results = asyncio.run(main())
+
+    assert [doc.id for doc in results] == ["chunk:1", "chunk:2"]
+    assert float(results[0].score) < float(results[1].score)
+    assert search.stats()["hits"] == 1
+
+
+def test_local_search_evicts_over_budget():
+    search = LocalSearch()
+    matrix = np.zeros((4, 4), dtype=np.float32)
+    search.max_bytes = matrix.nbytes * 2
+    for client_id in ["a", "b", "c"]:
+        search._store(client_id, TenantMatrix(1, matrix.copy(), [{}] * 4))
+
+    assert search.stats()["clients"] == 2
+    assert "a" not in search._matrices
+
+    # An older load finishing late doesn't replace a newer one
+    search._store("c", TenantMatrix(0, matrix.copy(), []))
+    assert search._matrices["c"].version == 1
+
+    search.invalidate("c")
+    assert search.stats()["clients"] == 1
+    assert search.stats()["bytes"] == matrix.nbytes
+
+
+def test_retrieval_cache_keys_on_version_and_options():
+    cache = RetrievalCache()
+
+    key = cache.key("client", 1, "Hello  World", top_k=3)
+
+    assert key == cache.key("client", 1, "hello world", top_k=3)
+    assert key != cache.key("client", 2, "hello world", top_k=3)
+    assert key != cache.key("client", 1, "hello world", top_k=5)
+    assert key != cache.key("other", 1, "hello world", top_k=3)
+
+
+def test_retrieval_cache_get_set(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_CACHE_SIZE", "1")
+    monkeypatch.setenv("RETRIEVAL_CACHE_FLUSH_INTERVAL", "3600")
+    cache = RetrievalCache()
+    first = cache.key("client", 1, "first")
+    second = cache.key("client", 1, "second")
+
+    assert cache.get(None, "client", first) is None
+    cache.set(first, [{"content": "a"}])
+    assert cache.get(None, "client", first) == [{"content": "a"}]
+    cache.set(second, [])
+    assert cache.get(None, "client", first) is None
+    assert cache.get(None, "client", second) == []
+
+    assert cache.stats() == {"hits": 2, "misses": 2, "size": 1}
+    assert cache._pending == {"client": [2, 2]}
+
+
+def test_retrieval_cache_expires_entries(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_CACHE_TTL", "0")
+    cache = RetrievalCache()
+    key = cache.key("client", 1, "query")
+    cache.set(key, [{"content": "a"}])
+
+    assert cache.get(None, "client", key) is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import routes
+from app.models import ClientConfig
+from app.redis_client import get_redis
+
+
+class FakeInputs:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def config(self):
+        return ClientConfig(client_id="client", name="Client")
+
+    async def history(self):
+        return {"turns": [], "summary": ""}
+
+    async def embedding(self):
+        return None
+
+    async def chunks(self):
+        return self._chunks
+
+    def cancel(self):
+        pass
+
+    def server_timing(self):
+        return ""
+
+
+class FakeRedis:
+    def __init__(self):
+        self.cached = []
+        self.stored = []
+        self.memory_updates = 0
+
+    async def get_corpus(self, client_id, read=None):
+        return {"chunk_count": 1, "file_count": 1, "version": 1}
+
+    async def get_exact_cached_response(self, client_id, key, corpus_version):
+        return None
+
+    async def cache_response(self, key, response, **kwargs):
+        self.cached.append(response)
+
+    async def store_chat_message(self, client_id, session_id, message, response, *args):
+        self.stored.append(response)
+
+
+def parse_events(body):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines.get("event"), json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis = FakeRedis()
+    chunks = [{"content": "Opening hours are 9 to 5."}]
+    monkeypatch.setattr(
+        routes.chat_pipeline, "start", lambda *args, **kwargs: FakeInputs(chunks)
+    )
+    monkeypatch.setattr(routes.limiter, "enabled", False)
+
+    async def update_memory(*args):
+        redis.memory_updates += 1
+
+    monkeypatch.setattr(routes.session_memory, "update", update_memory)
+
+    app = FastAPI()
+    app.state.limiter = routes.limiter
+    app.include_router(routes.router)
+    app.dependency_overrides[get_redis] = lambda: redis
+    return TestClient(app), redis
+
+
+def post_message(client):
+    return client.post(
+        "/chat/stream", json={"message": "When are you open?", "client_id": "client"}
+    )
+
+
+def test_stream_stores_complete_turn(client, monkeypatch):
+    test_client, redis = client
+
+    async def stream(*args):
+        yield "9 to "
+        yield "5."
+
+    monkeypatch.setattr(routes, "stream_ai_response", stream)
+
+    events = parse_events(post_message(test_client).text)
+
+    assert [event for event, _ in events] == [None, None, "done"]
+    assert redis.cached == ["9 to 5."]
+    assert redis.stored == ["9 to 5."]
+    assert redis.memory_updates == 1
+
+
+def test_stream_error_is_not_cached_or_stored(client, monkeypatch):
+    test_client, redis = client
+
+    async def stream(*args):
+        yield "9 to "
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(routes, "stream_ai_response", stream)
+
+    events = parse_events(post_message(test_client).text)
+
+    assert events[0] == (None, {"token": "9 to "})
+    assert events[-1][0] == "error"
+    assert "connection reset" in events[-1][1]["error"]
+    assert redis.cached == []
+    assert redis.stored == []
+    assert redis.memory_updates == 0
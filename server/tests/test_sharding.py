@@ -0,0 +1,33 @@
+from collections import Counter
+
+from app.sharding import HashRing
+
+
+def test_hash_ring_is_deterministic():
+    ring = HashRing(["a", "b", "c"])
+    other = HashRing(["c", "a", "b"])
+
+    assert all(ring.get(f"client{i}") == other.get(f"client{i}") for i in range(100))
+
+
+def test_hash_ring_spreads_clients():
+    ring = HashRing(["a", "b", "c"])
+
+    counts = Counter(ring.get(f"client{i}") for i in range(3000))
+
+    assert set(counts) == {"a", "b", "c"}
+    assert min(counts.values()) > 600
+
+
+def test_hash_ring_adding_a_shard_only_moves_clients_to_it():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [
+        client
+        for client in (f"client{i}" for i in range(3000))
+        if before.get(client) != after.get(client)
+    ]
+
+    assert all(after.get(client) == "d" for client in moved)
+    assert 400 < len(moved) < 1200
@@ -0,0 +1,47 @@
+"""PDF ingestion worker: parses, embeds and stores queued uploads.
+
+Run from the server directory alongside the API (any number of instances):
+
+    python worker.py
+"""
+
+import asyncio
+import os
+import socket
+
+from dotenv import load_dotenv
+
+from app.redis_client import redis_client, init_redis, close_redis
+from app.llm import close_llm
+from app.ingestion import ingestion_queue
+from app.extraction import pdf_extractor
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+load_dotenv()
+
+
+async def main():
+    await init_redis()
+    concurrency = int(os.getenv("INGEST_WORKER_CONCURRENCY", "2"))
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        await asyncio.gather(
+            *(
+                ingestion_queue.run(redis_client, f"{name}-{i}")
+                for i in range(concurrency)
+            )
+        )
+    finally:
+        print("Shutting down ingestion worker...")
+        await close_redis()
+        await close_llm()
+        pdf_extractor.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass